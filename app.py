@@ -23,88 +23,37 @@ section[data-testid="stSidebar"] > div {
 </style>
 """, unsafe_allow_html=True)
 
-import sqlite3
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import plotly.express as px
 import time
 from io import BytesIO
-import os
-import sys
-import re
+import hashlib
 import json
 
-try:
-    from google.oauth2 import service_account
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-except Exception:
-        # Jika lib belum terinstal saat pengembangan lokal, biarkan — Streamlit Cloud akan menginstall dari requirements.
-        pass
-
-import io as _io_temp
-
-def _get_drive_service():
-    sa_json = st.secrets.get("GDRIVE_SERVICE_ACCOUNT", None)
-    if not sa_json:
-        st.error("Service account credentials tidak ditemukan di st.secrets['GDRIVE_SERVICE_ACCOUNT']. Tambahkan di Streamlit Cloud → Manage app → Secrets.")
-        st.stop()
-    try:
-        sa_info = json.loads(sa_json)
-    except Exception as e:
-        st.error("Invalid JSON di GDRIVE_SERVICE_ACCOUNT: " + str(e))
-        st.stop()
-    creds = service_account.Credentials.from_service_account_info(sa_info, scopes=["https://www.googleapis.com/auth/drive"])
-    service = build("drive", "v3", credentials=creds, cache_discovery=False)
-    return service
-
-def download_db_from_drive(file_id, local_path):
-    try:
-        drive = _get_drive_service()
-        request = drive.files().get_media(fileId=file_id)
-        fh = _io_temp.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        with open(local_path, "wb") as f:
-            f.write(fh.getbuffer())
-        return True, "Downloaded DB from Drive."
-    except Exception as e:
-        return False, str(e)
+import db
+import drive_sync
+import excel_import
+import importer
+import jobs
 
-def upload_db_to_drive(file_id, local_path):
-    try:
-        drive = _get_drive_service()
-        media = MediaFileUpload(local_path, mimetype="application/x-sqlite3", resumable=True)
-        updated = drive.files().update(fileId=file_id, media_body=media).execute()
-        return True, "Uploaded DB to Drive."
-    except Exception as e:
-        return False, str(e)
+def upload_after_write(local_db_path=db.DB_PATH):
+    if not queue_drive_upload(local_db_path):
+        st.warning("DRIVE_FILE_ID tidak ada di secrets; melewatkan upload_after_write.")
 
-def upload_after_write(local_db_path='inventory_rumah.db'):
+def queue_drive_upload(local_db_path=db.DB_PATH):
+    # tanpa elemen UI, jadi aman dipanggil dari thread job import.
+    # False bila ada perubahan tapi DRIVE_FILE_ID tidak diset.
+    # lewati upload jika isi database tidak berubah sejak upload terakhir
+    if not drive_sync.is_dirty(local_db_path):
+        return True
     DRIVE_FILE_ID = st.secrets.get("DRIVE_FILE_ID", None)
     if not DRIVE_FILE_ID:
-        st.warning("DRIVE_FILE_ID tidak ada di secrets; melewatkan upload_after_write.")
-        return
-    ok, msg = upload_db_to_drive(DRIVE_FILE_ID, local_db_path)
-    if not ok:
-        st.warning("Auto-upload gagal: " + str(msg))
-    else:
-        # gunakan st.toast() jika tersedia, atau st.success()
-        try:
-            st.toast("Database auto-synced to Drive.")
-        except Exception:
-            st.success("Database auto-synced to Drive.")
-
-def get_resource_path(relative_path):
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
-
-DB_PATH = get_resource_path('inventory_rumah.db')
+        return False
+    # upload dikerjakan thread background (debounce + retry), UI tidak menunggu
+    drive_sync.notify_dirty(DRIVE_FILE_ID, local_db_path)
+    return True
 
 st.set_page_config(
     page_title="Inventory Gudang",
@@ -112,15 +61,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# ---------- STARTUP: pastikan DB ada lokal dengan mendownload dari Drive ----------
 DRIVE_FILE_ID = st.secrets.get("DRIVE_FILE_ID", None)
-LOCAL_DB = "inventory_rumah.db"
-if DRIVE_FILE_ID and not os.path.exists(LOCAL_DB):
-    ok, msg = download_db_from_drive(DRIVE_FILE_ID, LOCAL_DB)
-    if ok:
-        st.info("Database berhasil didownload dari Google Drive saat startup.")
-    else:
-        st.warning("Gagal download DB dari Drive saat startup: " + str(msg))
+LOCAL_DB = db.DB_PATH
 
 
 # Session state
@@ -138,6 +80,8 @@ if 'import_barang_config' not in st.session_state:
     st.session_state.import_barang_config = {}
 if 'selected_sheets_barang' not in st.session_state:
     st.session_state.selected_sheets_barang = {}
+if 'import_jobs_aktif' not in st.session_state:
+    st.session_state.import_jobs_aktif = False
 
 # ================= LOGIN & ROLE SYSTEM =================
 users = {
@@ -163,15 +107,12 @@ if st.session_state.user_role is None:
 
 # ================= FUNGSI HELPER =================
 
-def format_date_only(df, date_columns):
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce').apply(lambda x: x.date() if pd.notna(x) else None)
-    return df
+# kolom tanggal dari db.read_typed bertipe datetime64; di Excel ditulis sebagai tanggal
+EXCEL_DATE_FORMATS = {'date_format': 'yyyy-mm-dd', 'datetime_format': 'yyyy-mm-dd'}
 
 def create_excel_download(df, filename_prefix, button_label):
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+    with pd.ExcelWriter(output, engine='xlsxwriter', **EXCEL_DATE_FORMATS) as writer:
         df.to_excel(writer, index=False, sheet_name='Data')
         worksheet = writer.sheets['Data']
         if not df.empty:
@@ -188,6 +129,114 @@ def create_excel_download(df, filename_prefix, button_label):
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
+def create_lazy_excel_download(key, load_df, filename_prefix, button_label):
+    # file Excel berisi semua baris hasil filter baru dibuat saat diminta,
+    # bukan di setiap render halaman riwayat
+    if st.button("📄 Siapkan File Excel", key=f"{key}_prepare_excel"):
+        create_excel_download(load_df(), filename_prefix, button_label)
+
+def riwayat_stok_display(df):
+    display_df = df.copy()
+    display_df['Jenis'] = np.where(display_df['jumlah_tambah'] > 0, '➕ Tambah', '➖ Kurang')
+    display_df['Jumlah'] = display_df['jumlah_tambah'].abs()
+    display_df['tanggal_tambah'] = display_df['tanggal_tambah'].dt.date
+
+    display_df = display_df.rename(columns={
+        'id': 'ID',
+        'nama_barang': 'Nama Barang',
+        'stok_sebelum': 'Stok Sebelum',
+        'stok_sesudah': 'Stok Sesudah',
+        'gudang': 'Gudang',
+        'tanggal_tambah': 'Tanggal'
+    })
+    return display_df[['ID', 'Jenis', 'Nama Barang', 'Jumlah', 'Stok Sebelum', 'Stok Sesudah', 'Gudang', 'Tanggal']]
+
+def penggunaan_display(df):
+    display_df = df.assign(tanggal_pinjam=df['tanggal_pinjam'].dt.date).rename(columns={
+        'id': 'ID',
+        'nama_barang': 'Nama Barang',
+        'jumlah_pinjam': 'Jumlah Penggunaan',
+        'tanggal_pinjam': 'Tanggal Penggunaan',
+        'unit': 'Unit',
+        'besaran_stok': 'Satuan',
+        'gudang': 'Gudang'
+    })
+    return display_df[['ID', 'Nama Barang', 'Jumlah Penggunaan', 'Tanggal Penggunaan', 'Unit', 'Satuan', 'Gudang']]
+
+def read_weekly_workbook(uploaded_file, day_row):
+    # Workbook upload diparse sekali per isi file (hash): header mingguan dan
+    # unpivot SEN..MIN dikerjakan per sheet (paralel bila sheet banyak), lalu
+    # preview dan import di setiap rerun memakai hasil per sheet dari cache.
+    # Mengembalikan ({sheet: frame preview}, {sheet: sel hari}).
+    data = uploaded_file.getvalue()
+    return _load_weekly_workbook(hashlib.sha256(data).hexdigest(), data, day_row)
+
+@st.cache_data(show_spinner="Membaca file Excel...", max_entries=4)
+def _load_weekly_workbook(digest, _data, day_row):
+    return excel_import.parse_weekly_workbook(_data, day_row)
+
+# xlsx sebesar ini otomatis diimpor dengan mode streaming
+STREAM_MIN_BYTES = 50_000_000
+
+def streaming_mode(uploaded_file, key):
+    # xlsx sangat besar dibaca baris demi baris (openpyxl read-only) dan
+    # ditulis per chunk, supaya memori tidak melonjak saat import
+    is_xlsx = uploaded_file.name.lower().endswith('.xlsx')
+    return st.checkbox("💾 Mode hemat memori (streaming per chunk)",
+                       value=is_xlsx and uploaded_file.size >= STREAM_MIN_BYTES,
+                       disabled=not is_xlsx, key=key,
+                       help="Untuk file .xlsx sangat besar: data dibaca dan disimpan bertahap. "
+                            "Bila import terputus, ulangi saja; baris yang sudah masuk dilewati.")
+
+def read_weekly_preview(uploaded_file, day_row):
+    # mode streaming: hanya nama sheet dan baris awal per sheet yang dibaca
+    return _load_weekly_preview(uploaded_file.file_id, uploaded_file, day_row)
+
+@st.cache_data(show_spinner="Membaca file Excel...", max_entries=4)
+def _load_weekly_preview(file_id, _source, day_row):
+    return {name: excel_import.preview_weekly_sheet(_source, name, day_row)
+            for name in excel_import.stream_sheet_names(_source)}
+
+def read_hpp_preview(uploaded_file):
+    # mode streaming HPP: {sheet: preview baris awal}
+    return _load_hpp_preview(uploaded_file.file_id, uploaded_file)
+
+@st.cache_data(show_spinner="Membaca file Excel...", max_entries=4)
+def _load_hpp_preview(file_id, _source):
+    return {name: excel_import.preview_pengeluaran_material(_source, name)
+            for name in excel_import.stream_sheet_names(_source)}
+
+PAGE_SIZE_OPTIONS = [25, 50, 100, 250]
+
+def paginated_history(key, table, date_col, where, params):
+    # Tabel riwayat per halaman (terbaru dulu). Stack cursor halaman disimpan
+    # di session_state dan direset setiap kali filter atau ukuran halaman berubah.
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col4:
+        page_size = st.selectbox("Baris per halaman", PAGE_SIZE_OPTIONS, index=1, key=f"{key}_page_size")
+
+    signature = (where, tuple(params), page_size)
+    pager = st.session_state.setdefault(f"{key}_pager", {"signature": None, "cursors": [None]})
+    if pager["signature"] != signature:
+        pager["signature"] = signature
+        pager["cursors"] = [None]
+
+    df_page, has_next = get_history_page(table, date_col, where, params, pager["cursors"][-1], page_size)
+
+    with col1:
+        if st.button("⬅️ Sebelumnya", key=f"{key}_prev", disabled=len(pager["cursors"]) == 1, use_container_width=True):
+            pager["cursors"].pop()
+            st.rerun()
+    with col2:
+        if st.button("Berikutnya ➡️", key=f"{key}_next", disabled=not has_next, use_container_width=True):
+            last = df_page.iloc[-1]
+            pager["cursors"].append((last['sort_key'], int(last['id'])))
+            st.rerun()
+    with col3:
+        st.caption(f"Halaman {len(pager['cursors'])}")
+
+    return df_page.drop(columns=['sort_key'])
+
 def generate_unit_options():
     units = []
     for letter in ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I']:
@@ -197,114 +246,22 @@ def generate_unit_options():
 
 # ================= DATABASE FUNCTIONS =================
 
+# tabel yang perubahannya dicatat untuk sync incremental ke Drive
+SYNCED_TABLES = ['barang', 'peminjaman', 'riwayat_stok', 'hpp', 'peminjaman_harian', 'peminjaman_bulanan',
+                 'hpp_bulanan', 'hpp_material', 'import_ledger']
+
 def init_db():
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-
-    c.execute('''CREATE TABLE IF NOT EXISTS barang (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nama_barang TEXT NOT NULL,
-                stok INTEGER NOT NULL,
-                besaran_stok TEXT NOT NULL,
-                gudang TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS peminjaman (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                barang_id INTEGER,
-                nama_barang TEXT NOT NULL,
-                jumlah_pinjam INTEGER NOT NULL,
-                tanggal_pinjam DATE NOT NULL,
-                unit TEXT NOT NULL,
-                besaran_stok TEXT NOT NULL,
-                gudang TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (barang_id) REFERENCES barang (id)
-                )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS riwayat_stok (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                barang_id INTEGER,
-                nama_barang TEXT NOT NULL,
-                jumlah_tambah INTEGER NOT NULL,
-                stok_sebelum INTEGER NOT NULL,
-                stok_sesudah INTEGER NOT NULL,
-                gudang TEXT NOT NULL,
-                tanggal_tambah TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (barang_id) REFERENCES barang (id)
-                )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS hpp (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                unit TEXT NOT NULL,
-                tanggal DATE NOT NULL,
-                material TEXT NOT NULL,
-                harga REAL NOT NULL,
-                keterangan TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )''')
-
-    conn.commit()
-    conn.close()
-    upload_after_write(LOCAL_DB)
+    db.migrate()
+    if drive_sync.incremental_enabled(DRIVE_FILE_ID):
+        drive_sync.install_change_tracking(db.get_conn(), SYNCED_TABLES)
+    else:
+        drive_sync.remove_change_tracking(db.get_conn())
 
 # ================= HPP FUNCTIONS =================
 
 def read_pengeluaran_material(path, sheet_name="Pengeluaran Material", verbose=True):
     df_raw = pd.read_excel(path, sheet_name=sheet_name, header=None)
-    
-    data_rows = []
-    skipped_rows = []
-
-    for idx, row in df_raw.iterrows():
-        tanggal_raw = row[1]
-        material_raw = row[2]
-        unit_raw = row[3]
-        harga_raw = row[5]
-        
-        material_str = str(material_raw).lower().strip()
-        harga_str = str(harga_raw).strip()
-        
-        if material_str in ['nan', 'none', ''] or not material_str:
-            continue
-        
-        header_exact = ['material', 'tanggal', 'keterangan', 'no', 'item']
-        if material_str in header_exact:
-            skipped_rows.append(f"Row {idx}: Header row")
-            continue
-        
-        if re.match(r'^(jumlah|total|subtotal|grand total|catatan|summary)', material_str):
-            skipped_rows.append(f"Row {idx}: Summary row - '{material_str[:50]}'")
-            continue
-        
-        if not harga_str or harga_str.lower() in ["nan", "none", ""]:
-            continue
-        
-        harga_clean = re.sub(r'[^\d.-]', '', harga_str)
-        
-        try:
-            harga = float(harga_clean)
-            if harga <= 0 or harga > 100_000_000:
-                skipped_rows.append(f"Row {idx}: Harga ekstrem - {harga:,.0f}")
-                continue
-        except (ValueError, TypeError):
-            skipped_rows.append(f"Row {idx}: Invalid harga '{harga_raw}'")
-            continue
-
-        tanggal = None
-        if pd.notna(tanggal_raw) and str(tanggal_raw).strip():
-            try:
-                tanggal = pd.to_datetime(tanggal_raw, errors='coerce')
-            except:
-                pass
-        
-        material = str(material_raw).strip() if pd.notna(material_raw) else ""
-        unit = str(unit_raw).strip() if pd.notna(unit_raw) else ""
-        
-        data_rows.append([tanggal, material, unit, harga])
-
-    df = pd.DataFrame(data_rows, columns=["Tanggal", "Material", "Unit", "Harga"])
+    df, skipped_rows = excel_import.parse_pengeluaran_material(df_raw)
     total_harga = df["Harga"].sum()
     total_rupiah = f"Rp {total_harga:,.0f}".replace(",", ".")
 
@@ -313,97 +270,38 @@ def read_pengeluaran_material(path, sheet_name="Pengeluaran Material", verbose=T
 
     return df, total_harga
 
+# jalur tulis hpp satu baris (import: importer.write_hpp_rows); tanggal
+# selalu dinormalkan db.to_iso_date dan disimpan YYYY-MM-DD
+def _insert_hpp(c, unit, tanggal, material, harga, keterangan=""):
+    c.execute(importer.HPP_INSERT_SQL, (unit, db.to_iso_date(tanggal), material, harga, keterangan, None, None))
+
 def add_hpp_data(unit, tanggal, material, harga, keterangan=""):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-    # normalize tanggal to YYYY-MM-DD string for sqlite
-    if isinstance(tanggal, pd.Timestamp):
-        tanggal = tanggal.strftime('%Y-%m-%d')
-    elif isinstance(tanggal, datetime):
-        tanggal = tanggal.date().strftime('%Y-%m-%d')
-    elif isinstance(tanggal, str):
-        try:
-            parsed = pd.to_datetime(tanggal, errors='coerce')
-            if pd.notna(parsed):
-                tanggal = parsed.strftime('%Y-%m-%d')
-        except:
-            pass
-    c.execute("""INSERT INTO hpp (unit, tanggal, material, harga, keterangan)
-                 VALUES (?, ?, ?, ?, ?)""", (unit, tanggal, material, harga, keterangan))
-    conn.commit()
-    conn.close()
+    with db.transaction() as c:
+        _insert_hpp(c, unit, tanggal, material, harga, keterangan)
+        db.apply_hpp_rollup(c, "id = ?", (c.lastrowid,))
     upload_after_write(LOCAL_DB)
 
-def get_hpp_data(unit=None, start_date=None, end_date=None):
-    conn = sqlite3.connect('inventory_rumah.db')
-    df = pd.read_sql_query("SELECT * FROM hpp", conn)
-    conn.close()
-    if df.empty:
-        return df
-
-    # --- parsing tanggal: coba beberapa format, fallback ke to_datetime ---
-    if 'tanggal' in df.columns:
-        # jika tipe sudah datetime, biarkan; jika string, coba parse format yang kita gunakan
-        if not pd.api.types.is_datetime64_any_dtype(df['tanggal']):
-            # first try YYYY-MM-DD then try DD/MM/YYYY then generic parse
-            def safe_parse(x):
-                if pd.isna(x):
-                    return pd.NaT
-                s = str(x).strip()
-                for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
-                    try:
-                        return pd.to_datetime(s, format=fmt, errors='raise')
-                    except Exception:
-                        continue
-                # last resort: let pandas infer
-                return pd.to_datetime(s, errors='coerce')
-            df['tanggal'] = df['tanggal'].apply(safe_parse)
-        else:
-            df['tanggal'] = pd.to_datetime(df['tanggal'], errors='coerce')
-
-    # --- filter unit ---
-    if unit and unit not in ["Semua", "Semua Unit"]:
-        df = df[df['unit'] == unit]
+def get_hpp_data(unit=None, start_date=None, end_date=None, search=None):
+    return _load_hpp_data(db.cache_version(), unit, start_date, end_date, search)
 
-    # --- filter tanggal (start_date/end_date may be date objects or strings) ---
-    if start_date is not None:
-        start_dt = pd.to_datetime(start_date, errors='coerce')
-        if pd.notna(start_dt):
-            df = df[df['tanggal'] >= start_dt]
-
-    if end_date is not None:
-        end_dt = pd.to_datetime(end_date, errors='coerce')
-        if pd.notna(end_dt):
-            df = df[df['tanggal'] <= end_dt]
-
-    # --- untuk konsistensi tampilan/ekspor: format tanggal ke 'DD/MM/YYYY' ---
-    if 'tanggal' in df.columns:
-        df['tanggal'] = df['tanggal'].dt.strftime('%d/%m/%Y')
-
-    # sort descending by tanggal (opsional)
-    if 'tanggal' in df.columns:
-        try:
-            df = df.sort_values(by='tanggal', ascending=False)
-        except Exception:
-            pass
-
-    return df
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_hpp_data(version, unit, start_date, end_date, search):
+    # tanggal tersimpan YYYY-MM-DD (lihat migrasi db), jadi filter dan urutan
+    # cukup di SQL; format tampilan DD/MM/YYYY juga dibuat oleh SQLite
+    where, params = hpp_filters(unit, start_date, end_date, search)
+    return db.read_df("SELECT id, unit, strftime('%d/%m/%Y', tanggal) AS tanggal, material, harga, keterangan, created_at"
+                      " FROM hpp" + where + " ORDER BY hpp.tanggal DESC, id DESC", params)
 
 
 def delete_hpp(hpp_id):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM hpp WHERE id = ?", (hpp_id,))
-    conn.commit()
-    conn.close()
+    with db.transaction() as c:
+        db.delete_hpp_rows(c, "id = ?", (hpp_id,))
     upload_after_write(LOCAL_DB)
     return True, "Data HPP berhasil dihapus"
 
 # ================= BARANG FUNCTIONS =================
 
-def add_barang(nama, stok, besaran, gudang, tanggal_dibuat):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
+def _insert_barang(c, nama, stok, besaran, gudang, tanggal_dibuat):
     c.execute("INSERT INTO barang (nama_barang, stok, besaran_stok, gudang, created_at) VALUES (?, ?, ?, ?, ?)",
               (nama, stok, besaran, gudang, tanggal_dibuat))
     barang_id = c.lastrowid
@@ -413,23 +311,24 @@ def add_barang(nama, stok, besaran, gudang, tanggal_dibuat):
                   (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
                   (barang_id, nama, stok, 0, stok, gudang, tanggal_dibuat))
+    return barang_id
 
-    conn.commit()
-    conn.close()
+def add_barang(nama, stok, besaran, gudang, tanggal_dibuat):
+    with db.transaction() as c:
+        _insert_barang(c, nama, stok, besaran, gudang, tanggal_dibuat)
     upload_after_write(LOCAL_DB)
 
 def kurangi_stok(barang_id, stok_dikurangi, tanggal_transaksi):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
+    with db.transaction() as c:
+        c.execute("SELECT nama_barang, stok, gudang FROM barang WHERE id = ?", (barang_id,))
+        barang_data = c.fetchone()
 
-    c.execute("SELECT nama_barang, stok, gudang FROM barang WHERE id = ?", (barang_id,))
-    barang_data = c.fetchone()
+        if not barang_data:
+            return False, "Barang tidak ditemukan"
 
-    if barang_data:
         nama_barang, stok_sebelum, gudang = barang_data
 
         if stok_sebelum < stok_dikurangi:
-            conn.close()
             return False, f"Stok tidak mencukupi. Stok tersedia: {stok_sebelum}"
 
         stok_sesudah = stok_sebelum - stok_dikurangi
@@ -439,22 +338,17 @@ def kurangi_stok(barang_id, stok_dikurangi, tanggal_transaksi):
                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
                   (barang_id, nama_barang, -stok_dikurangi, stok_sebelum, stok_sesudah, gudang, tanggal_transaksi))
 
-        conn.commit()
-        conn.close()
-        upload_after_write(LOCAL_DB)
-        return True, f"Stok berhasil dikurangi {stok_dikurangi}"
-
-    conn.close()
-    return False, "Barang tidak ditemukan"
+    upload_after_write(LOCAL_DB)
+    return True, f"Stok berhasil dikurangi {stok_dikurangi}"
 
 def update_stok(barang_id, stok_tambahan, tanggal_transaksi):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
+    with db.transaction() as c:
+        c.execute("SELECT nama_barang, stok, gudang FROM barang WHERE id = ?", (barang_id,))
+        barang_data = c.fetchone()
 
-    c.execute("SELECT nama_barang, stok, gudang FROM barang WHERE id = ?", (barang_id,))
-    barang_data = c.fetchone()
+        if not barang_data:
+            return
 
-    if barang_data:
         nama_barang, stok_sebelum, gudang = barang_data
         stok_sesudah = stok_sebelum + stok_tambahan
 
@@ -464,118 +358,384 @@ def update_stok(barang_id, stok_tambahan, tanggal_transaksi):
                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
                   (barang_id, nama_barang, stok_tambahan, stok_sebelum, stok_sesudah, gudang, tanggal_transaksi))
 
-        conn.commit()
-        conn.close()
-        upload_after_write(LOCAL_DB)
+    upload_after_write(LOCAL_DB)
+
+# ================= JOB IMPORT EXCEL =================
+# Import sheet mingguan dijalankan sebagai job di background (jobs.py).
+# Fungsi *_job menerima [(sheet, config)] dan salah satu dari: sel hasil
+# parse dari cache (mode biasa, satu transaksi) atau isi file xlsx (mode
+# streaming, commit per chunk). Hasilnya dict pesan untuk panel job.
+
+def _job_hasil(skipped_sheets, skipped_rows, errors):
+    hasil = {'info': [], 'errors': errors}
+    if skipped_sheets:
+        hasil['info'].append(f"⏭️ Dilewati karena sudah pernah diimpor: {', '.join(skipped_sheets)}")
+    if skipped_rows:
+        hasil['info'].append(f"⏭️ {skipped_rows} baris sudah pernah diimpor dan dilewati.")
+    if not queue_drive_upload(LOCAL_DB):
+        hasil['info'].append("DRIVE_FILE_ID tidak ada di secrets; melewatkan upload ke Drive.")
+    return hasil
+
+def barang_masuk_job(sheets, sheet_cells=None, source=None):
+    def run(progress):
+        errors, sheet_events, skipped_sheets, skipped_rows = [], [], [], 0
+        totals, seen = (0, 0), {}
+        for sheet_name, config in sheets:
+            try:
+                if not config:
+                    errors.append(f"Sheet '{sheet_name}': Konfigurasi tidak ditemukan.")
+                    continue
+                if source is not None:
+                    chunks = (excel_import.weekly_events(cells, config['tanggal_senin']).assign(gudang=config['gudang'], sheet=sheet_name)
+                              for cells in excel_import.stream_weekly_cells(BytesIO(source), sheet_name, day_row=3))
+                    totals, dilewati, dilewati_baris = importer.stream_import_sheet(
+                        'barang_masuk', sheet_name, chunks, importer.import_barang_masuk, seen, totals, progress)
+                    skipped_rows += dilewati_baris
+                    if dilewati:
+                        skipped_sheets.append(sheet_name)
+                    continue
+                events = excel_import.weekly_events(sheet_cells[sheet_name], config['tanggal_senin'])
+                sheet_events.append(events.assign(gudang=config['gudang'], sheet=sheet_name))
+            except Exception as e:
+                errors.append(f"Sheet '{sheet_name}': {str(e)}")
+
+        if sheet_events:
+            totals, skipped_sheets, skipped_rows = importer.write_import_sheets(
+                'barang_masuk', sheet_events, importer.import_barang_masuk, totals, progress)
+
+        total_imported, total_updated = totals
+        hasil = _job_hasil(skipped_sheets, skipped_rows, errors)
+        if total_imported > 0 or total_updated > 0:
+            hasil['success'] = f"✅ Berhasil import barang masuk! **{total_imported}** barang baru dan **{total_updated}** penambahan stok!"
+        else:
+            hasil['warning'] = "⚠️ Tidak ada barang yang berhasil diimport. Cek format file Excel Anda."
+        return hasil
+    return run
+
+def penggunaan_job(sheets, sheet_cells=None, source=None):
+    def run(progress):
+        errors, sheet_events, skipped_sheets, skipped_rows = [], [], [], 0
+        totals, seen = (0,), {}
+        for sheet_name, config in sheets:
+            try:
+                if source is not None:
+                    chunks = (excel_import.weekly_events(cells, config['tanggal_senin']).assign(unit=config['unit'], sheet=sheet_name)
+                              for cells in excel_import.stream_weekly_cells(BytesIO(source), sheet_name, day_row=2))
+                    totals, dilewati, dilewati_baris = importer.stream_import_sheet(
+                        'penggunaan', sheet_name, chunks,
+                        lambda c, rows: (importer.write_penggunaan(c, rows),), seen, totals, progress)
+                    skipped_rows += dilewati_baris
+                    if dilewati:
+                        skipped_sheets.append(sheet_name)
+                    continue
+                events = excel_import.weekly_events(sheet_cells[sheet_name], config['tanggal_senin'])
+                sheet_events.append(events.assign(unit=config['unit'], sheet=sheet_name))
+            except Exception as e:
+                errors.append(f"Sheet '{sheet_name}': {str(e)}")
+
+        if sheet_events:
+            totals, skipped_sheets, skipped_rows = importer.write_import_sheets(
+                'penggunaan', sheet_events, lambda c, rows: (importer.write_penggunaan(c, rows),), totals, progress)
+
+        total_imported = totals[0]
+        hasil = _job_hasil(skipped_sheets, skipped_rows, errors)
+        if total_imported > 0:
+            hasil['success'] = f"✅ Berhasil import **{total_imported}** transaksi penggunaan dari {len(sheets)} sheet!"
+        else:
+            hasil['warning'] = "⚠️ Tidak ada transaksi yang berhasil diimport. Cek format file Excel Anda."
+        return hasil
+    return run
+
+def hpp_job(sheet_name, unit, keterangan, rows=None, source=None):
+    # rows: baris importer.hpp_import_rows dari preview (mode biasa); source:
+    # isi file xlsx yang dibaca ulang per chunk (mode streaming)
+    def run(progress):
+        if source is not None:
+            chunks = (importer.hpp_import_rows(df, unit, sheet_name)
+                      for df, _ in excel_import.stream_pengeluaran_material(BytesIO(source), sheet_name))
+            (imported_count,), dilewati, skipped_rows = importer.stream_import_sheet(
+                'hpp', sheet_name, chunks, lambda c, baru: (importer.write_hpp_rows(c, baru, keterangan),), {}, (0,), progress)
+            skipped_sheets = [sheet_name] if dilewati else []
+        else:
+            (imported_count,), skipped_sheets, skipped_rows = importer.write_import_sheets(
+                'hpp', [rows], lambda c, baru: (importer.write_hpp_rows(c, baru, keterangan),), (0,), progress)
+
+        hasil = _job_hasil(skipped_sheets, skipped_rows, [])
+        if imported_count > 0:
+            hasil['success'] = f"✅ Berhasil import {imported_count} data HPP!"
+        else:
+            hasil['warning'] = "⚠️ Tidak ada data HPP baru yang diimport."
+        return hasil
+    return run
+
+JOB_POLL_SECONDS = 2
+JOB_STATUS_LABEL = {'antri': '🕒 Menunggu', 'jalan': '⏳ Berjalan', 'selesai': '✅ Selesai', 'gagal': '❌ Gagal'}
+JOB_JENIS_LABEL = {'barang_masuk': 'Barang Masuk', 'penggunaan': 'Riwayat Penggunaan', 'hpp': 'HPP'}
+
+def show_import_jobs():
+    # Panel job import di sidebar. Selama ada job aktif fragment ini rerun
+    # sendiri tiap JOB_POLL_SECONDS tanpa menjalankan ulang halaman, jadi
+    # user tetap bisa pindah menu sambil memantau progress.
+    st.fragment(run_every=JOB_POLL_SECONDS if jobs.has_active() else None)(_import_jobs_panel)()
+
+def _import_jobs_panel():
+    df = jobs.recent()
+    aktif = bool(df['status'].isin(jobs.STATUS_AKTIF).any())
+    if st.session_state.import_jobs_aktif and not aktif:
+        # job baru selesai: rerun penuh supaya halaman membaca data baru dan polling berhenti
+        st.session_state.import_jobs_aktif = False
+        st.rerun()
+    st.session_state.import_jobs_aktif = aktif
+    if df.empty:
+        return
+
+    st.write("---")
+    st.caption("📥 Import Excel")
+    for job in df.itertuples():
+        st.markdown(f"{JOB_STATUS_LABEL[job.status]} **{JOB_JENIS_LABEL.get(job.jenis, job.jenis)}** · {job.nama_file}")
+        if job.status == 'jalan':
+            if pd.notna(job.baris_total) and job.baris_total > 0:
+                st.progress(min(job.baris_diproses / job.baris_total, 1.0),
+                            text=f"{job.baris_diproses:,} / {int(job.baris_total):,} baris")
+            else:
+                st.caption(f"{job.baris_diproses:,} baris diproses")
+        elif job.status == 'gagal':
+            st.error(f"❌ {job.error}")
+        elif job.status == 'selesai':
+            if job.hasil.get('success'):
+                st.success(job.hasil['success'])
+            if job.hasil.get('warning'):
+                st.warning(job.hasil['warning'])
+            for info in job.hasil.get('info', []):
+                st.info(info)
+            if job.hasil.get('errors'):
+                with st.expander(f"⚠️ {len(job.hasil['errors'])} error"):
+                    for error in job.hasil['errors']:
+                        st.write(f"- {error}")
+
+ALL_OPTIONS = ("Semua", "Semua Unit", "Semua Gudang")
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def build_filters(date_col=None, start_date=None, end_date=None, search_col=None, search=None, extra=(), **equals):
+    # WHERE berparameter untuk getter. Rentang tanggal setengah terbuka
+    # [start, end + 1 hari) supaya index kolom tanggal terpakai dan nilai
+    # yang berisi jam (YYYY-MM-DD HH:MM:SS) tetap masuk hari terakhir.
+    clauses, params = list(extra), []
+    if start_date is not None:
+        clauses.append(f"{date_col} >= ?")
+        params.append(pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+    if end_date is not None:
+        clauses.append(f"{date_col} < ?")
+        params.append((pd.Timestamp(end_date) + timedelta(days=1)).strftime('%Y-%m-%d'))
+    for col, value in equals.items():
+        if value and value not in ALL_OPTIONS:
+            clauses.append(f"{col} = ?")
+            params.append(value)
+    if search and search.strip():
+        clauses.append(f"{search_col} LIKE ? ESCAPE '\\'")
+        params.append(f"%{_escape_like(search.strip())}%")
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+def riwayat_stok_filters(start_date=None, end_date=None, gudang=None, jenis=None, search=None):
+    extra = {"Tambah": ["jumlah_tambah > 0"], "Kurang": ["jumlah_tambah < 0"]}.get(jenis, [])
+    return build_filters("tanggal_tambah", start_date, end_date, "nama_barang", search, extra, gudang=gudang)
+
+def peminjaman_filters(start_date=None, end_date=None, unit=None, gudang=None, search=None):
+    return build_filters("tanggal_pinjam", start_date, end_date, "nama_barang", search, unit=unit, gudang=gudang)
+
+def hpp_filters(unit=None, start_date=None, end_date=None, search=None):
+    return build_filters("hpp.tanggal", start_date, end_date, "material", search, unit=unit)
+
+# Getter di bawah di-cache lintas sesi dengan kunci db.cache_version(), yang
+# naik setiap kali ada transaksi yang mengubah data. Setiap pemanggil tetap
+# menerima salinan DataFrame sendiri (perilaku st.cache_data).
 
 def get_barang():
-    conn = sqlite3.connect('inventory_rumah.db')
-    df = pd.read_sql_query("SELECT * FROM barang ORDER BY nama_barang", conn)
-    conn.close()
-    return df
+    return _load_barang(db.cache_version())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_barang(version):
+    return db.read_typed("SELECT * FROM barang ORDER BY nama_barang")
 
 def get_barang_by_id(barang_id):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM barang WHERE id = ?", (barang_id,))
-    result = c.fetchone()
-    conn.close()
-    return result
-
-def get_riwayat_stok():
-    conn = sqlite3.connect('inventory_rumah.db')
-    df = pd.read_sql_query("SELECT * FROM riwayat_stok ORDER BY tanggal_tambah DESC", conn)
-    conn.close()
-    df = format_date_only(df, ['tanggal_tambah'])
-    return df
+    return db.fetchone("SELECT * FROM barang WHERE id = ?", (barang_id,))
 
-def delete_barang(barang_id):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
+def get_riwayat_stok(start_date=None, end_date=None, gudang=None, jenis=None, search=None):
+    return _load_riwayat_stok(db.cache_version(), start_date, end_date, gudang, jenis, search)
 
-    c.execute("SELECT COUNT(*) FROM peminjaman WHERE barang_id = ?", (barang_id,))
-    has_transactions = c.fetchone()[0] > 0
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_riwayat_stok(version, start_date, end_date, gudang, jenis, search):
+    where, params = riwayat_stok_filters(start_date, end_date, gudang, jenis, search)
+    return db.read_typed("SELECT * FROM riwayat_stok" + where + " ORDER BY tanggal_tambah DESC", params)
 
-    if has_transactions:
-        conn.close()
-        return False, "Barang tidak bisa dihapus karena masih ada riwayat penggunaan"
+def delete_barang(barang_id):
+    with db.transaction() as c:
+        c.execute("SELECT COUNT(*) FROM peminjaman WHERE barang_id = ?", (barang_id,))
+        has_transactions = c.fetchone()[0] > 0
+
+        if has_transactions:
+            return False, "Barang tidak bisa dihapus karena masih ada riwayat penggunaan"
 
-    c.execute("SELECT nama_barang FROM barang WHERE id = ?", (barang_id,))
-    nama_barang = c.fetchone()[0]
+        c.execute("SELECT nama_barang FROM barang WHERE id = ?", (barang_id,))
+        nama_barang = c.fetchone()[0]
 
-    c.execute("DELETE FROM barang WHERE id = ?", (barang_id,))
-    conn.commit()
-    conn.close()
+        c.execute("DELETE FROM barang WHERE id = ?", (barang_id,))
     upload_after_write(LOCAL_DB)
     return True, f"Barang '{nama_barang}' berhasil dihapus"
 
 def delete_penggunaan(penggunaan_id):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM peminjaman WHERE id = ?", (penggunaan_id,))
-    conn.commit()
-    conn.close()
+    with db.transaction() as c:
+        db.apply_usage_rollup(c, "id = ?", (penggunaan_id,), sign=-1)
+        db.ledger_forget(c, 'peminjaman', "id = ?", (penggunaan_id,))
+        c.execute("DELETE FROM peminjaman WHERE id = ?", (penggunaan_id,))
     upload_after_write(LOCAL_DB)
     return True, "Riwayat penggunaan berhasil dihapus"
 
 def delete_riwayat_stok(riwayat_id):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM riwayat_stok WHERE id = ?", (riwayat_id,))
-    conn.commit()
-    conn.close()
+    with db.transaction() as c:
+        db.ledger_forget(c, 'riwayat_stok', "id = ?", (riwayat_id,))
+        c.execute("DELETE FROM riwayat_stok WHERE id = ?", (riwayat_id,))
     upload_after_write(LOCAL_DB)
     return True, "Riwayat penambahan stok berhasil dihapus"
 
 def add_peminjaman(barang_id, nama_barang, jumlah, tanggal, unit, besaran, gudang):
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-
     try:
-        c.execute("SELECT stok FROM barang WHERE id = ?", (barang_id,))
-        current_stock = c.fetchone()
+        with db.transaction() as c:
+            c.execute("SELECT stok FROM barang WHERE id = ?", (barang_id,))
+            current_stock = c.fetchone()
 
-        if not current_stock or current_stock[0] < jumlah:
-            conn.close()
-            return False, f"Stok tidak mencukupi. Stok tersedia: {current_stock[0] if current_stock else 0}"
+            if not current_stock or current_stock[0] < jumlah:
+                return False, f"Stok tidak mencukupi. Stok tersedia: {current_stock[0] if current_stock else 0}"
 
-        c.execute("""INSERT INTO peminjaman
-                    (barang_id, nama_barang, jumlah_pinjam, tanggal_pinjam, unit, besaran_stok, gudang)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                  (barang_id, nama_barang, jumlah, tanggal, unit, besaran, gudang))
+            c.execute("""INSERT INTO peminjaman
+                        (barang_id, nama_barang, jumlah_pinjam, tanggal_pinjam, unit, besaran_stok, gudang)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                      (barang_id, nama_barang, jumlah, tanggal, unit, besaran, gudang))
+            db.apply_usage_rollup(c, "id = ?", (c.lastrowid,))
 
-        c.execute("UPDATE barang SET stok = stok - ? WHERE id = ?", (jumlah, barang_id))
+            c.execute("UPDATE barang SET stok = stok - ? WHERE id = ?", (jumlah, barang_id))
 
-        conn.commit()
-        conn.close()
         upload_after_write(LOCAL_DB)
 
         return True, f"Berhasil menggunakan {jumlah} {besaran} {nama_barang} untuk unit {unit}"
 
     except Exception as e:
-        conn.rollback()
-        conn.close()
         return False, f"Error: {str(e)}"
 
-def get_peminjaman():
-    conn = sqlite3.connect('inventory_rumah.db')
-    df = pd.read_sql_query("SELECT * FROM peminjaman ORDER BY created_at DESC", conn)
-    conn.close()
-    df = format_date_only(df, ['tanggal_pinjam', 'created_at'])
-    return df
+def get_peminjaman(start_date=None, end_date=None, unit=None, gudang=None, search=None):
+    return _load_peminjaman(db.cache_version(), start_date, end_date, unit, gudang, search)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_peminjaman(version, start_date, end_date, unit, gudang, search):
+    where, params = peminjaman_filters(start_date, end_date, unit, gudang, search)
+    return db.read_typed("SELECT * FROM peminjaman" + where + " ORDER BY created_at DESC", params)
+
+STOK_MINIMUM = 20
+# batas baris grafik/tabel Dashboard; daftar lengkap ada di menu masing-masing
+DASHBOARD_ROWS = 50
 
 def check_stok_rendah():
-    conn = sqlite3.connect('inventory_rumah.db')
-    df = pd.read_sql_query("SELECT * FROM barang WHERE stok < 20", conn)
-    conn.close()
-    return df
+    return _load_stok_rendah(db.cache_version())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_stok_rendah(version):
+    return db.read_typed("SELECT * FROM barang WHERE stok < ?", (STOK_MINIMUM,))
+
+def get_dashboard_summary():
+    return _load_dashboard_summary(db.cache_version(), datetime.now().date())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_dashboard_summary(version, today):
+    # semua angka Dashboard dalam satu query; penggunaan hari ini lewat index tanggal
+    where, params = build_filters("tanggal_pinjam", today, today)
+    row = db.fetchone(f"""SELECT
+            (SELECT COUNT(*) FROM barang),
+            (SELECT COALESCE(SUM(stok), 0) FROM barang),
+            (SELECT COUNT(*) FROM peminjaman{where}),
+            (SELECT COUNT(*) FROM barang WHERE stok < ?),
+            (SELECT json_group_object(gudang, total)
+               FROM (SELECT gudang, SUM(stok) AS total FROM barang GROUP BY gudang ORDER BY gudang))""",
+        (*params, STOK_MINIMUM))
+    return {
+        'total_item': row[0],
+        'total_stok': row[1],
+        'penggunaan_hari_ini': row[2],
+        'stok_rendah': row[3],
+        'stok_per_gudang': json.loads(row[4]) if row[4] else {},
+    }
+
+def get_usage_units():
+    return _load_usage_units(db.cache_version())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_usage_units(version):
+    return db.read_df("SELECT DISTINCT unit FROM peminjaman_bulanan ORDER BY unit")['unit'].tolist()
+
+def get_usage_months(unit=None):
+    return _load_usage_months(db.cache_version(), unit)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_usage_months(version, unit):
+    where, params = build_filters(unit=unit)
+    df = db.read_df("SELECT DISTINCT bulan FROM peminjaman_bulanan" + where + " ORDER BY bulan", params)
+    return df['bulan'].tolist()
+
+# Laporan mingguan/bulanan dibaca dari tabel ringkasan (lihat db.apply_usage_rollup);
+# "Semua Unit" dijumlahkan lintas unit.
+
+def get_hpp_units():
+    return cached_query("SELECT DISTINCT unit FROM hpp_material ORDER BY unit")['unit'].tolist()
+
+def get_usage_daily_totals(start_date, end_date, unit=None):
+    where, params = build_filters("tanggal", start_date, end_date, unit=unit)
+    return cached_query("SELECT tanggal AS tanggal_pinjam, nama_barang, besaran_stok, SUM(jumlah) AS jumlah_pinjam"
+                        " FROM peminjaman_harian" + where +
+                        " GROUP BY tanggal, nama_barang, besaran_stok ORDER BY tanggal, nama_barang, besaran_stok", params,
+                        typed=True)
+
+def get_usage_monthly_totals(bulan=None, unit=None):
+    where, params = build_filters(bulan=bulan, unit=unit)
+    return cached_query("SELECT bulan, nama_barang, besaran_stok, SUM(jumlah) AS jumlah_pinjam"
+                        " FROM peminjaman_bulanan" + where +
+                        " GROUP BY bulan, nama_barang, besaran_stok ORDER BY bulan, nama_barang, besaran_stok", params)
+
+def cached_query(sql, params=(), typed=False):
+    # hasil query agregat kecil (total, top-N) dengan cache yang sama
+    return _load_query(db.cache_version(), sql, tuple(params), typed)
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _load_query(version, sql, params, typed):
+    return (db.read_typed if typed else db.read_df)(sql, params)
+
+def get_history_page(table, date_col, where, params, after, page_size):
+    return _load_history_page(db.cache_version(), table, date_col, where, tuple(params), after, page_size)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_history_page(version, table, date_col, where, params, after, page_size):
+    # keyset pagination: halaman berikutnya dimulai sesudah (tanggal, id) baris
+    # terakhir halaman sebelumnya, jadi biayanya tetap walau riwayat sangat
+    # panjang (tidak ada OFFSET yang harus melewati baris-baris awal)
+    params = list(params)
+    if after is not None:
+        where += (" AND " if where else " WHERE ") + f"({date_col}, id) < (?, ?)"
+        params += list(after)
+    df = db.read_typed(f"SELECT *, {date_col} AS sort_key FROM {table}{where} "
+                    f"ORDER BY {date_col} DESC, id DESC LIMIT ?", params + [page_size + 1])
+    return df.iloc[:page_size], len(df) > page_size
+
+def month_range(bulan):
+    # 'YYYY-MM' -> (tanggal pertama, tanggal terakhir) bulan tersebut
+    start = datetime.strptime(bulan, '%Y-%m').date()
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
 
 def add_sample_data():
-    conn = sqlite3.connect('inventory_rumah.db')
-    c = conn.cursor()
-
-    c.execute("SELECT COUNT(*) FROM barang")
-    if c.fetchone()[0] == 0:
+    with db.transaction() as c:
+        if c.execute("SELECT COUNT(*) FROM barang").fetchone()[0] > 0:
+            return
         today = datetime.now().date()
         sample_data = [
             ('Semen', 50, 'Sak', 'Gudang 1', today),
@@ -587,15 +747,32 @@ def add_sample_data():
         ]
 
         for item in sample_data:
-            add_barang(item[0], item[1], item[2], item[3], item[4])
-
-    conn.commit()
-    conn.close()
-    upload_after_write(LOCAL_DB)
-
-# Inisialisasi
-init_db()
-add_sample_data()
+            _insert_barang(c, *item)
+
+@st.cache_resource(show_spinner="Menyiapkan database...")
+def bootstrap():
+    # Sekali per proses server; rerun berikutnya hanya membaca hasil cache.
+    # Urutan: sinkron awal dari Drive, migrasi skema + trigger sync, data
+    # contoh (secret SEED_SAMPLE_DATA), lalu upload jika ada perubahan.
+    # Jangan memanggil elemen UI di sini: pesan ditampilkan oleh pemanggil.
+    startup_ok, startup_msg = True, ""
+    if DRIVE_FILE_ID:
+        startup_ok, startup_msg = drive_sync.startup_sync(DRIVE_FILE_ID, LOCAL_DB)
+    init_db()
+    if st.secrets.get("SEED_SAMPLE_DATA", True):
+        add_sample_data()
+    if DRIVE_FILE_ID and drive_sync.is_dirty(LOCAL_DB):
+        drive_sync.notify_dirty(DRIVE_FILE_ID, LOCAL_DB)
+    return {"startup_ok": startup_ok, "startup_msg": startup_msg}
+
+# Inisialisasi (sekali per proses)
+BOOT = bootstrap()
+if 'startup_sync_shown' not in st.session_state:
+    st.session_state.startup_sync_shown = True
+    if not BOOT["startup_ok"]:
+        st.warning("Gagal download DB dari Drive saat startup: " + str(BOOT["startup_msg"]))
+    elif BOOT["startup_msg"]:
+        st.info("Database berhasil didownload dari Google Drive saat startup.")
 
 # Header aplikasi
 st.title("📦 Aplikasi Inventory Gudang")
@@ -637,62 +814,84 @@ if st.sidebar.button("🚪 Logout"):
 st.sidebar.write("---")
 st.sidebar.caption("Gunakan menu untuk navigasi sistem")
 
+if DRIVE_FILE_ID:
+    sync_status = drive_sync.sync_status(LOCAL_DB)
+    if sync_status["last_error"]:
+        retry_in = max(0, int(sync_status["next_attempt"] - time.time()))
+        st.sidebar.caption(f"☁️ Sync Drive gagal ({sync_status['attempts']}x), dicoba lagi dalam {retry_in} detik")
+    elif sync_status["pending"]:
+        st.sidebar.caption("☁️ Menunggu sync ke Drive...")
+    else:
+        st.sidebar.caption("☁️ Database tersinkron dengan Drive")
+
+with st.sidebar:
+    show_import_jobs()
+
 # ================= MENU DASHBOARD =================
 if menu == "🏠 Dashboard":
     st.header("🏠 Dashboard Inventory")
 
-    df_barang = get_barang()
-    df_peminjaman = get_peminjaman()
-    stok_rendah = check_stok_rendah()
+    summary = get_dashboard_summary()
 
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        total_item = len(df_barang)
-        st.metric("📦 Total Item", total_item)
+        st.metric("📦 Total Item", summary['total_item'])
 
     with col2:
-        total_stok = df_barang['stok'].sum() if not df_barang.empty else 0
-        st.metric("📊 Total Stok", total_stok)
+        st.metric("📊 Total Stok", summary['total_stok'])
 
     with col3:
-        penggunaan_hari_ini = len(df_peminjaman[pd.to_datetime(df_peminjaman['tanggal_pinjam'], errors='coerce').dt.date == datetime.now().date()]) if not df_peminjaman.empty else 0
-        st.metric("📝 Penggunaan Hari Ini", penggunaan_hari_ini)
+        st.metric("📝 Penggunaan Hari Ini", summary['penggunaan_hari_ini'])
 
     with col4:
-        item_stok_rendah = len(stok_rendah)
-        st.metric("⚠️ Stok Rendah", item_stok_rendah, delta_color="inverse")
+        st.metric("⚠️ Stok Rendah", summary['stok_rendah'], delta_color="inverse")
 
-    if not stok_rendah.empty:
-        st.error(f"⚠️ PERINGATAN! Ada {len(stok_rendah)} barang dengan stok kurang dari 20!")
+    if summary['stok_rendah'] > 0:
+        st.error(f"⚠️ PERINGATAN! Ada {summary['stok_rendah']} barang dengan stok kurang dari {STOK_MINIMUM}!")
         with st.expander("👁️ Lihat Detail Stok Rendah"):
-            st.dataframe(stok_rendah[['nama_barang', 'stok', 'besaran_stok', 'gudang']], use_container_width=True)
+            stok_rendah = cached_query("SELECT nama_barang, stok, besaran_stok, gudang FROM barang WHERE stok < ?"
+                                       " ORDER BY stok, nama_barang LIMIT ?", (STOK_MINIMUM, DASHBOARD_ROWS))
+            st.dataframe(stok_rendah, use_container_width=True)
+            if summary['stok_rendah'] > DASHBOARD_ROWS:
+                st.caption(f"Menampilkan {DASHBOARD_ROWS} stok terendah dari {summary['stok_rendah']} barang. "
+                           "Daftar lengkap ada di menu ⚠️ Stok Rendah.")
     else:
         st.success("✅ Semua stok barang mencukupi!")
 
-    if not df_barang.empty:
+    if summary['total_item'] > 0:
         col1, col2 = st.columns(2)
 
         with col1:
             st.subheader("📊 Distribusi Stok per Gudang")
-            stok_gudang = df_barang.groupby('gudang')['stok'].sum().reset_index()
+            stok_gudang = pd.DataFrame(list(summary['stok_per_gudang'].items()), columns=['gudang', 'stok'])
             fig = px.pie(stok_gudang, values='stok', names='gudang',
                          title="Distribusi Total Stok per Gudang",
                          color_discrete_sequence=px.colors.qualitative.Set3)
             st.plotly_chart(fig, use_container_width=True)
 
         with col2:
-            st.subheader("📋 Status Stok Semua Barang")
-            fig2 = px.bar(df_barang, x='nama_barang', y='stok', color='gudang',
-                          title="Jumlah Stok per Barang",
+            st.subheader("📋 Status Stok Barang")
+            # dikelompokkan di SQL; hanya DASHBOARD_ROWS barang dengan stok terendah
+            stok_barang = cached_query("SELECT nama_barang, gudang, SUM(stok) AS stok FROM barang"
+                                       " GROUP BY nama_barang, gudang ORDER BY stok, nama_barang LIMIT ?",
+                                       (DASHBOARD_ROWS,))
+            judul = ("Jumlah Stok per Barang" if summary['total_item'] <= DASHBOARD_ROWS
+                     else f"Jumlah Stok {DASHBOARD_ROWS} Barang Terendah")
+            fig2 = px.bar(stok_barang, x='nama_barang', y='stok', color='gudang',
+                          title=judul,
                           labels={'stok': 'Jumlah Stok', 'nama_barang': 'Nama Barang'})
-            fig2.add_hline(y=20, line_dash="dash", line_color="red",
-                           annotation_text="⚠️ Batas Minimum (20)")
+            fig2.add_hline(y=STOK_MINIMUM, line_dash="dash", line_color="red",
+                           annotation_text=f"⚠️ Batas Minimum ({STOK_MINIMUM})")
             st.plotly_chart(fig2, use_container_width=True)
 
     st.subheader("📋 Ringkasan Barang")
-    if not df_barang.empty:
-        st.dataframe(df_barang[['nama_barang', 'stok', 'besaran_stok', 'gudang']], use_container_width=True)
+    if summary['total_item'] > 0:
+        ringkasan = cached_query("SELECT nama_barang, stok, besaran_stok, gudang FROM barang"
+                                 " ORDER BY nama_barang LIMIT ?", (DASHBOARD_ROWS,))
+        st.dataframe(ringkasan, use_container_width=True)
+        if summary['total_item'] > DASHBOARD_ROWS:
+            st.caption(f"Menampilkan {DASHBOARD_ROWS} dari {summary['total_item']} barang (urut nama).")
     else:
         st.info("🔭 Belum ada data barang.")
 
@@ -875,11 +1074,11 @@ elif menu == "📦 Kelola Barang":
         st.subheader("📜 Riwayat Perubahan Stok")
 
         tab_view, tab_delete = st.tabs(["👁️ Lihat Riwayat", "🗑️ Hapus Riwayat"])
+        # pilihan hapus = halaman riwayat yang sedang tampil (filter + keyset page)
+        df_page = pd.DataFrame()
 
         with tab_view:
-            df_riwayat = get_riwayat_stok()
-
-            if not df_riwayat.empty:
+            if db.has_rows("riwayat_stok"):
                 col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
                 with col1:
                     start_date = st.date_input("📅 Dari Tanggal", value=datetime.now().date() - timedelta(days=30), key="riwayat_start")
@@ -890,46 +1089,30 @@ elif menu == "📦 Kelola Barang":
                 with col4:
                     search_barang = st.text_input("🔍 Cari Barang", key="riwayat_search")
 
-                mask = (pd.to_datetime(df_riwayat['tanggal_tambah'], errors='coerce').dt.date >= start_date) & (pd.to_datetime(df_riwayat['tanggal_tambah'], errors='coerce').dt.date <= end_date)
-                df_filtered = df_riwayat.loc[mask]
-
-                if filter_jenis == "Tambah":
-                    df_filtered = df_filtered[df_filtered['jumlah_tambah'] > 0]
-                elif filter_jenis == "Kurang":
-                    df_filtered = df_filtered[df_filtered['jumlah_tambah'] < 0]
-
-                if search_barang:
-                    df_filtered = df_filtered[df_filtered['nama_barang'].str.contains(search_barang, case=False)]
+                where, params = riwayat_stok_filters(start_date, end_date, jenis=filter_jenis, search=search_barang)
+                totals = cached_query(
+                    "SELECT COUNT(*) AS jumlah_riwayat,"
+                    " COALESCE(SUM(CASE WHEN jumlah_tambah > 0 THEN jumlah_tambah END), 0) AS total_penambahan,"
+                    " COALESCE(SUM(CASE WHEN jumlah_tambah <= 0 THEN -jumlah_tambah END), 0) AS total_pengurangan"
+                    " FROM riwayat_stok" + where, params).iloc[0]
 
-                if not df_filtered.empty:
-                    st.info(f"📊 Menampilkan {len(df_filtered)} riwayat perubahan stok")
+                if totals['jumlah_riwayat'] > 0:
+                    st.info(f"📊 Menampilkan {totals['jumlah_riwayat']} riwayat perubahan stok")
 
-                    display_df = df_filtered.copy()
-                    display_df['Jenis'] = display_df['jumlah_tambah'].apply(lambda x: '➕ Tambah' if x > 0 else '➖ Kurang')
-                    display_df['Jumlah'] = display_df['jumlah_tambah'].abs()
-
-                    display_df = display_df.rename(columns={
-                        'id': 'ID',
-                        'nama_barang': 'Nama Barang',
-                        'stok_sebelum': 'Stok Sebelum',
-                        'stok_sesudah': 'Stok Sesudah',
-                        'gudang': 'Gudang',
-                        'tanggal_tambah': 'Tanggal'
-                    })
-
-                    display_cols = ['ID', 'Jenis', 'Nama Barang', 'Jumlah', 'Stok Sebelum', 'Stok Sesudah', 'Gudang', 'Tanggal']
-                    st.dataframe(display_df[display_cols], use_container_width=True)
-
-                    total_penambahan = display_df[display_df['Jenis'] == '➕ Tambah']['Jumlah'].sum()
-                    total_pengurangan = display_df[display_df['Jenis'] == '➖ Kurang']['Jumlah'].sum()
+                    df_page = paginated_history("riwayat_stok", "riwayat_stok", "tanggal_tambah", where, params)
+                    display_df = riwayat_stok_display(df_page)
+                    st.dataframe(display_df, use_container_width=True)
 
                     col1, col2 = st.columns(2)
                     with col1:
-                        st.metric("📊 Total Stok Ditambahkan", total_penambahan)
+                        st.metric("📊 Total Stok Ditambahkan", int(totals['total_penambahan']))
                     with col2:
-                        st.metric("📉 Total Stok Dikurangi", total_pengurangan)
+                        st.metric("📉 Total Stok Dikurangi", int(totals['total_pengurangan']))
 
-                    create_excel_download(display_df[display_cols], "riwayat_stok", "📥 Download Excel")
+                    create_lazy_excel_download(
+                        "riwayat_stok",
+                        lambda: riwayat_stok_display(get_riwayat_stok(start_date, end_date, jenis=filter_jenis, search=search_barang)),
+                        "riwayat_stok", "📥 Download Excel")
                 else:
                     st.info("🔭 Tidak ada riwayat perubahan stok dalam rentang tanggal tersebut.")
             else:
@@ -938,14 +1121,14 @@ elif menu == "📦 Kelola Barang":
         with tab_delete:
             st.warning("⚠️ **PERHATIAN:** Hapus riwayat hanya untuk koreksi kesalahan input. Stok barang TIDAK akan berubah!")
 
-            df_riwayat = get_riwayat_stok()
+            st.caption("📄 Pilihan mengikuti filter dan halaman yang sedang tampil di tab Lihat Riwayat.")
 
-            if not df_riwayat.empty:
+            if not df_page.empty:
                 riwayat_options = {}
-                for _, row in df_riwayat.iterrows():
+                for _, row in df_page.iterrows():
                     jenis = "Tambah" if row['jumlah_tambah'] > 0 else "Kurang"
                     jumlah = abs(row['jumlah_tambah'])
-                    label = f"ID-{row['id']}: {jenis} {row['nama_barang']} ({jumlah}) - {row['tanggal_tambah']}"
+                    label = f"ID-{row['id']}: {jenis} {row['nama_barang']} ({jumlah}) - {row['tanggal_tambah'].date()}"
                     riwayat_options[label] = row['id']
 
                 with st.form("form_hapus_riwayat_stok"):
@@ -970,7 +1153,7 @@ elif menu == "📦 Kelola Barang":
                         else:
                             st.error("❌ Harap centang konfirmasi untuk menghapus riwayat!")
             else:
-                st.info("🔭 Belum ada riwayat untuk dihapus.")
+                st.info("🔭 Tidak ada riwayat untuk dihapus pada filter/halaman ini.")
 
 # ================= MENU PENGGUNAAN =================
 elif menu == "📝 Penggunaan":
@@ -1043,166 +1226,11 @@ elif menu == "📝 Penggunaan":
         st.subheader("📜 Riwayat Penggunaan")
 
         tab_view, tab_delete = st.tabs(["👁️ Lihat Riwayat", "🗑️ Hapus Riwayat"])
+        # pilihan hapus = halaman riwayat yang sedang tampil (filter + keyset page)
+        df_page = pd.DataFrame()
 
         with tab_view:
-            df_peminjaman = get_peminjaman()
-
-            if not df_peminjaman.empty:
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    start_date = st.date_input("📅 Dari Tanggal", value=datetime.now().date() - timedelta(days=30))
-                with col2:
-                    end_date = st.date_input("📅 Sampai Tanggal", value=datetime.now().date())
-                with col3:
-                    search_barang = st.text_input("🔍 Cari Barang")
-
-                mask = (pd.to_datetime(df_peminjaman['tanggal_pinjam'], errors='coerce').dt.date >= start_date) & (pd.to_datetime(df_peminjaman['tanggal_pinjam'], errors='coerce').dt.date <= end_date)
-                df_filtered = df_peminjaman.loc[mask]
-
-                if search_barang:
-                    df_filtered = df_filtered[df_filtered['nama_barang'].str.contains(search_barang, case=False)]
-
-                if not df_filtered.empty:
-                    st.info(f"📊 Menampilkan {len(df_filtered)} transaksi penggunaan")
-
-                    display_df = df_filtered.copy()
-                    display_df = display_df.rename(columns={
-                        'id': 'ID',
-                        'nama_barang': 'Nama Barang',
-                        'jumlah_pinjam': 'Jumlah Penggunaan',
-                        'tanggal_pinjam': 'Tanggal Penggunaan',
-                        'unit': 'Unit',
-                        'besaran_stok': 'Satuan',
-                        'gudang': 'Gudang'
-                    })
-
-                    st.dataframe(display_df[['ID', 'Nama Barang', 'Jumlah Penggunaan', 'Tanggal Penggunaan', 'Unit', 'Satuan', 'Gudang']], use_container_width=True)
-
-                    total_transaksi = len(df_filtered)
-                    total_barang = df_filtered['jumlah_pinjam'].sum()
-
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("📊 Total Transaksi", total_transaksi)
-                    with col2:
-                        st.metric("📦 Total Barang Digunakan", total_barang)
-
-                    create_excel_download(display_df[['ID', 'Nama Barang', 'Jumlah Penggunaan', 'Tanggal Penggunaan', 'Unit', 'Satuan', 'Gudang']], "riwayat_penggunaan", "📥 Download Excel")
-                else:
-                    st.info("🔭 Tidak ada penggunaan dalam rentang tanggal tersebut.")
-            else:
-                st.info("🔭 Belum ada riwayat penggunaan.")
-
-        with tab_delete:
-            st.warning("⚠️ **PERHATIAN:** Hapus riwayat hanya untuk koreksi kesalahan input. Stok barang TIDAK akan dikembalikan!")
-
-            df_peminjaman = get_peminjaman()
-
-            if not df_peminjaman.empty:
-                penggunaan_options = {f"ID-{row['id']}: {row['nama_barang']} ({row['jumlah_pinjam']} {row['besaran_stok']}) - Unit {row['unit']} - {row['tanggal_pinjam']}": row['id']
-                                     for _, row in df_peminjaman.iterrows()}
-
-                with st.form("form_hapus_penggunaan"):
-                    selected_penggunaan = st.selectbox("🗑️ Pilih riwayat penggunaan yang akan dihapus", list(penggunaan_options.keys()))
-
-                    st.markdown("**Konfirmasi penghapusan:**")
-                    confirm = st.checkbox("✅ Saya yakin ingin menghapus riwayat ini")
-
-                    submitted = st.form_submit_button("🗑️ HAPUS RIWAYAT", type="secondary", use_container_width=True)
-
-                    if submitted:
-                        if confirm:
-                            penggunaan_id = penggunaan_options[selected_penggunaan]
-                            success, message = delete_penggunaan(penggunaan_id)
-
-                            if success:
-                                st.success(f"✅ {message}")
-                                time.sleep(1)
-                                st.rerun()
-                            else:
-                                st.error(f"❌ {message}")
-                        else:
-                            st.error("❌ Harap centang konfirmasi untuk menghapus riwayat!")
-            else:
-                st.info("🔭 Belum ada riwayat untuk dihapus.")
-
-# Penggunaan
-elif menu == "📝 Penggunaan":
-    st.header("📝 Kelola Penggunaan")
-
-    tab1, tab2 = st.tabs(["📤 Gunakan Barang", "📜 Riwayat Penggunaan"])
-
-    with tab1:
-        st.subheader("📤 Gunakan Barang")
-
-        if st.session_state.get('submission_success', False):
-            st.success("✅ Penggunaan berhasil diproses!")
-            st.balloons()
-            st.session_state.submission_success = False
-
-        df_barang = get_barang()
-        df_available = df_barang[df_barang['stok'] > 0] if not df_barang.empty else pd.DataFrame()
-
-        if not df_available.empty:
-            barang_options = {f"{row['nama_barang']} ({row['gudang']}) - Tersedia: {row['stok']} {row['besaran_stok']}": row['id']
-                            for _, row in df_available.iterrows()}
-
-            with st.form("form_penggunaan_fixed", clear_on_submit=False):
-                col1, col2 = st.columns(2)
-                with col1:
-                    selected_barang = st.selectbox("📦 Pilih Barang", list(barang_options.keys()))
-                    jumlah_pinjam = st.number_input("📊 Jumlah Gunakan", min_value=1, value=1, step=1)
-                    unit_options = generate_unit_options()
-                    unit = st.selectbox("🏠 Digunakan untuk Unit", unit_options)
-                with col2:
-                    tanggal_pinjam = st.date_input("📅 Tanggal Gunakan", value=datetime.now().date())
-                    st.write("")
-
-                submitted = st.form_submit_button("📤 Konfirmasi Penggunaan", use_container_width=True)
-
-                if submitted and not st.session_state.get('form_submitted', False):
-                    st.session_state.form_submitted = True
-
-                    barang_id = barang_options[selected_barang]
-                    barang_data = get_barang_by_id(barang_id)
-
-                    if barang_data:
-                        success, message = add_peminjaman(
-                            barang_id,
-                            barang_data[1],
-                            jumlah_pinjam,
-                            tanggal_pinjam,
-                            unit,
-                            barang_data[3],
-                            barang_data[4]
-                        )
-
-                        if success:
-                            st.session_state.submission_success = True
-                            st.session_state.form_submitted = False
-                            st.rerun()
-                        else:
-                            st.error(f"❌ {message}")
-                            st.session_state.form_submitted = False
-                    else:
-                        st.error("❌ Barang tidak ditemukan!")
-                        st.session_state.form_submitted = False
-
-                elif submitted:
-                    st.info("⏳ Penggunaan sedang diproses...")
-
-        else:
-            st.warning("⚠️ Tidak ada barang yang tersedia untuk digunakan.")
-
-    with tab2:
-        st.subheader("📜 Riwayat Penggunaan")
-
-        tab_view, tab_delete = st.tabs(["👁️ Lihat Riwayat", "🗑️ Hapus Riwayat"])
-
-        with tab_view:
-            df_peminjaman = get_peminjaman()
-
-            if not df_peminjaman.empty:
+            if db.has_rows("peminjaman"):
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     start_date = st.date_input("📅 Dari Tanggal", value=datetime.now().date() - timedelta(days=30))
@@ -1211,39 +1239,28 @@ elif menu == "📝 Penggunaan":
                 with col3:
                     search_barang = st.text_input("🔍 Cari Barang")
 
-                mask = (pd.to_datetime(df_peminjaman['tanggal_pinjam'], errors='coerce').dt.date >= start_date) & (pd.to_datetime(df_peminjaman['tanggal_pinjam'], errors='coerce').dt.date <= end_date)
-                df_filtered = df_peminjaman.loc[mask]
+                where, params = peminjaman_filters(start_date, end_date, search=search_barang)
+                totals = cached_query(
+                    "SELECT COUNT(*) AS total_transaksi, COALESCE(SUM(jumlah_pinjam), 0) AS total_barang"
+                    " FROM peminjaman" + where, params).iloc[0]
 
-                if search_barang:
-                    df_filtered = df_filtered[df_filtered['nama_barang'].str.contains(search_barang, case=False)]
+                if totals['total_transaksi'] > 0:
+                    st.info(f"📊 Menampilkan {totals['total_transaksi']} transaksi penggunaan")
 
-                if not df_filtered.empty:
-                    st.info(f"📊 Menampilkan {len(df_filtered)} transaksi penggunaan")
-
-                    display_df = df_filtered.copy()
-                    display_df = display_df.rename(columns={
-                        'id': 'ID',
-                        'nama_barang': 'Nama Barang',
-                        'jumlah_pinjam': 'Jumlah Penggunaan',
-                        'tanggal_pinjam': 'Tanggal Penggunaan',
-                        'unit': 'Unit',
-                        'besaran_stok': 'Satuan',
-                        'gudang': 'Gudang'
-                    })
-
-                    st.dataframe(display_df[['ID', 'Nama Barang', 'Jumlah Penggunaan', 'Tanggal Penggunaan', 'Unit', 'Satuan', 'Gudang']], use_container_width=True)
-
-                    total_transaksi = len(df_filtered)
-                    total_barang = df_filtered['jumlah_pinjam'].sum()
+                    df_page = paginated_history("riwayat_penggunaan", "peminjaman", "tanggal_pinjam", where, params)
+                    display_df = penggunaan_display(df_page)
+                    st.dataframe(display_df, use_container_width=True)
 
                     col1, col2 = st.columns(2)
                     with col1:
-                        st.metric("📊 Total Transaksi", total_transaksi)
+                        st.metric("📊 Total Transaksi", int(totals['total_transaksi']))
                     with col2:
-                        st.metric("📦 Total Barang Digunakan", total_barang)
+                        st.metric("📦 Total Barang Digunakan", int(totals['total_barang']))
 
-                    # Download Excel
-                    create_excel_download(display_df[['ID', 'Nama Barang', 'Jumlah Penggunaan', 'Tanggal Penggunaan', 'Unit', 'Satuan', 'Gudang']], "riwayat_penggunaan", "📥 Download Excel")
+                    create_lazy_excel_download(
+                        "riwayat_penggunaan",
+                        lambda: penggunaan_display(get_peminjaman(start_date, end_date, search=search_barang)),
+                        "riwayat_penggunaan", "📥 Download Excel")
                 else:
                     st.info("🔭 Tidak ada penggunaan dalam rentang tanggal tersebut.")
             else:
@@ -1252,11 +1269,11 @@ elif menu == "📝 Penggunaan":
         with tab_delete:
             st.warning("⚠️ **PERHATIAN:** Hapus riwayat hanya untuk koreksi kesalahan input. Stok barang TIDAK akan dikembalikan!")
 
-            df_peminjaman = get_peminjaman()
+            st.caption("📄 Pilihan mengikuti filter dan halaman yang sedang tampil di tab Lihat Riwayat.")
 
-            if not df_peminjaman.empty:
-                penggunaan_options = {f"ID-{row['id']}: {row['nama_barang']} ({row['jumlah_pinjam']} {row['besaran_stok']}) - Unit {row['unit']} - {row['tanggal_pinjam']}": row['id']
-                                     for _, row in df_peminjaman.iterrows()}
+            if not df_page.empty:
+                penggunaan_options = {f"ID-{row['id']}: {row['nama_barang']} ({row['jumlah_pinjam']} {row['besaran_stok']}) - Unit {row['unit']} - {row['tanggal_pinjam'].date()}": row['id']
+                                     for _, row in df_page.iterrows()}
 
                 with st.form("form_hapus_penggunaan"):
                     selected_penggunaan = st.selectbox("🗑️ Pilih riwayat penggunaan yang akan dihapus", list(penggunaan_options.keys()))
@@ -1280,29 +1297,24 @@ elif menu == "📝 Penggunaan":
                         else:
                             st.error("❌ Harap centang konfirmasi untuk menghapus riwayat!")
             else:
-                st.info("🔭 Belum ada riwayat untuk dihapus.")
+                st.info("🔭 Tidak ada riwayat untuk dihapus pada filter/halaman ini.")
 
 # Laporan
 elif menu == "📊 Laporan":
     st.header("📊 Laporan Penggunaan")
 
-    df_peminjaman = get_peminjaman()
-
-    if not df_peminjaman.empty:
-        df_peminjaman['tanggal_pinjam'] = pd.to_datetime(df_peminjaman['tanggal_pinjam'], errors='coerce')
-
+    if db.has_rows("peminjaman"):
         st.sidebar.subheader("🏠 Filter Unit")
-        unit_options = ["Semua Unit"] + sorted(df_peminjaman['unit'].unique().tolist())
+        unit_options = ["Semua Unit"] + get_usage_units()
         selected_unit = st.sidebar.selectbox("Pilih Unit", unit_options)
 
         if selected_unit != "Semua Unit":
-            df_peminjaman = df_peminjaman[df_peminjaman['unit'] == selected_unit]
             st.info(f"📋 Menampilkan data untuk unit: {selected_unit}")
 
         st.subheader("📅 Laporan Harian")
         tanggal_pilih = st.date_input("📅 Pilih Tanggal", value=datetime.now().date())
 
-        df_harian = df_peminjaman[df_peminjaman['tanggal_pinjam'].dt.date == tanggal_pilih]
+        df_harian = get_peminjaman(tanggal_pilih, tanggal_pilih, unit=selected_unit)
 
         if not df_harian.empty:
             col1, col2 = st.columns(2)
@@ -1343,18 +1355,12 @@ elif menu == "📊 Laporan":
 
         col1, col2, col3 = st.columns(3)
         with col1:
-            df_weekly = df_peminjaman.copy()
-            available_months = df_weekly['tanggal_pinjam'].dt.to_period('M').unique()
+            available_months = get_usage_months(selected_unit)
             if len(available_months) > 0:
-                month_options = [str(month) for month in sorted(available_months)]
+                month_options = available_months
                 selected_month = st.selectbox("📅 Pilih Bulan", month_options, index=len(month_options)-1 if month_options else 0)
 
-                year, month = map(int, selected_month.split('-'))
-
-                df_month = df_weekly[
-                    (df_weekly['tanggal_pinjam'].dt.year == year) &
-                    (df_weekly['tanggal_pinjam'].dt.month == month)
-                ]
+                df_month = get_usage_daily_totals(*month_range(selected_month), unit=selected_unit)
 
         with col2:
             week_filter = st.selectbox("📊 Filter Minggu", ["Semua Minggu", "Minggu 1", "Minggu 2", "Minggu 3", "Minggu 4"])
@@ -1363,15 +1369,14 @@ elif menu == "📊 Laporan":
             df_month = df_month.copy()
             df_month['iso_week'] = df_month['tanggal_pinjam'].dt.isocalendar().week
             df_month['week_of_month'] = ((df_month['tanggal_pinjam'].dt.day - 1) // 7) + 1
-            df_month['minggu'] = df_month['tanggal_pinjam'].apply(
-                lambda x: f"{x.year}-W{x.isocalendar()[1]:02d}"
-            )
+            df_month['minggu'] = (df_month['tanggal_pinjam'].dt.year.astype(str) + "-W" +
+                                  df_month['iso_week'].astype(str).str.zfill(2))
 
             if week_filter != "Semua Minggu":
                 week_num = int(week_filter.split()[1])
                 df_month = df_month[df_month['week_of_month'] == week_num]
 
-            weekly_data = df_month.groupby(['minggu', 'nama_barang', 'besaran_stok'])['jumlah_pinjam'].sum().reset_index()
+            weekly_data = df_month.groupby(['minggu', 'nama_barang', 'besaran_stok'], observed=True)['jumlah_pinjam'].sum().reset_index()
 
             weekly_data = weekly_data.rename(columns={
                 'minggu': 'Minggu',
@@ -1410,9 +1415,7 @@ elif menu == "📊 Laporan":
 
         st.subheader("📅 Laporan Bulanan")
 
-        df_monthly = df_peminjaman.copy()
-        df_monthly['bulan'] = df_monthly['tanggal_pinjam'].dt.strftime('%Y-%m')
-        available_months_monthly = sorted(df_monthly['bulan'].unique().tolist())
+        available_months_monthly = get_usage_months(selected_unit)
 
         if available_months_monthly:
             col1, col2 = st.columns([1, 2])
@@ -1424,8 +1427,7 @@ elif menu == "📊 Laporan":
                 )
 
             if selected_month_filter != "Semua Bulan":
-                df_monthly_filtered = df_monthly[df_monthly['bulan'] == selected_month_filter]
-                monthly_data = df_monthly_filtered.groupby(['bulan', 'nama_barang', 'besaran_stok'])['jumlah_pinjam'].sum().reset_index()
+                monthly_data = get_usage_monthly_totals(selected_month_filter, unit=selected_unit)
                 monthly_data = monthly_data.rename(columns={
                     'bulan': 'Bulan',
                     'nama_barang': 'Nama Barang',
@@ -1434,7 +1436,7 @@ elif menu == "📊 Laporan":
                 })
                 chart_title = f"📈 Penggunaan Bulanan - {selected_month_filter}"
             else:
-                monthly_data = df_monthly.groupby(['bulan', 'nama_barang', 'besaran_stok'])['jumlah_pinjam'].sum().reset_index()
+                monthly_data = get_usage_monthly_totals(unit=selected_unit)
                 monthly_data = monthly_data.rename(columns={
                     'bulan': 'Bulan',
                     'nama_barang': 'Nama Barang',
@@ -1517,19 +1519,31 @@ elif menu == "💰 Kelola HPP":
 
             if uploaded_file_hpp is not None:
                 try:
-                    excel_file = pd.ExcelFile(uploaded_file_hpp)
-                    sheet_names = excel_file.sheet_names
+                    stream_hpp = streaming_mode(uploaded_file_hpp, key="stream_hpp")
+                    if stream_hpp:
+                        hpp_previews = read_hpp_preview(uploaded_file_hpp)
+                        sheet_names = list(hpp_previews)
+                    else:
+                        sheet_names = pd.ExcelFile(uploaded_file_hpp).sheet_names
                     st.success(f"✅ File berhasil diupload! Ditemukan {len(sheet_names)} sheet.")
 
                     selected_sheet = st.selectbox("📋 Pilih Sheet", sheet_names)
 
                     # Baca dan preview data
-                    df_preview, total_preview = read_pengeluaran_material(uploaded_file_hpp, sheet_name=selected_sheet, verbose=False)
+                    if stream_hpp:
+                        df_preview = hpp_previews[selected_sheet]
+                    else:
+                        df_preview, total_preview = read_pengeluaran_material(uploaded_file_hpp, sheet_name=selected_sheet, verbose=False)
 
                     if not df_preview.empty:
-                        st.write("**Preview Data (10 baris terakhir):**")
-                        st.dataframe(df_preview.tail(10), use_container_width=True)
-                        st.metric("💰 Total HPP", f"Rp {total_preview:,.0f}".replace(",", "."))
+                        if stream_hpp:
+                            st.write("**Preview Data (10 baris pertama):**")
+                            st.dataframe(df_preview.head(10), use_container_width=True)
+                            st.caption("Total HPP dihitung saat import (mode streaming).")
+                        else:
+                            st.write("**Preview Data (10 baris terakhir):**")
+                            st.dataframe(df_preview.tail(10), use_container_width=True)
+                            st.metric("💰 Total HPP", f"Rp {total_preview:,.0f}".replace(",", "."))
 
                         col1, col2 = st.columns(2)
                         with col1:
@@ -1538,45 +1552,16 @@ elif menu == "💰 Kelola HPP":
                             keterangan_import = st.text_input("📝 Keterangan (Optional)", key="ket_import_hpp")
 
                         if st.button("🚀 Import Data HPP", type="primary", use_container_width=True):
-                            with st.spinner("Memproses import..."):
-                                conn = sqlite3.connect('inventory_rumah.db')
-                                c = conn.cursor()
-
-                                imported_count = 0
-                                for _, row in df_preview.iterrows():
-                                    if pd.notna(row['Tanggal']) and pd.notna(row['Harga']):
-                                        tanggal_val = row['Tanggal']
-                                        # jika Timestamp atau datetime -> format ke DD/MM/YYYY
-                                        if isinstance(tanggal_val, (pd.Timestamp, datetime)):
-                                            tanggal_str = tanggal_val.strftime('%d/%m/%Y')
-                                        elif isinstance(tanggal_val, str):
-                                            # possible raw strings: coba bersihkan lalu parse / normalisasi
-                                            t = tanggal_val.strip()
-                                            # jika format sudah YYYY-MM-DD, convert dulu ke dd/mm/YYYY
-                                            try:
-                                                parsed = pd.to_datetime(t, errors='coerce', dayfirst=False)
-                                                if pd.notna(parsed):
-                                                    # format menjadi DD/MM/YYYY
-                                                    tanggal_str = parsed.strftime('%d/%m/%Y')
-                                                else:
-                                                    tanggal_str = t  # fallback: simpan apa adanya
-                                            except:
-                                                tanggal_str = t
-                                        else:
-                                            tanggal_str = str(tanggal_val)
-
-                                        c.execute("""INSERT INTO hpp (unit, tanggal, material, harga, keterangan)
-                                                    VALUES (?, ?, ?, ?, ?)""",
-                                                (unit_for_import, tanggal_str, row['Material'], row['Harga'], keterangan_import))
-                                        imported_count += 1
-
-                                conn.commit()
-                                conn.close()
-
-                                st.success(f"✅ Berhasil import {imported_count} data HPP!")
-                                st.balloons()
-                                time.sleep(2)
-                                st.rerun()
+                            # import berjalan di thread job; progress & hasil tampil di sidebar
+                            if stream_hpp:
+                                job = hpp_job(selected_sheet, unit_for_import, keterangan_import,
+                                              source=uploaded_file_hpp.getvalue())
+                            else:
+                                job = hpp_job(selected_sheet, unit_for_import, keterangan_import,
+                                              rows=importer.hpp_import_rows(df_preview, unit_for_import, selected_sheet))
+                            jobs.submit('hpp', uploaded_file_hpp.name, job)
+                            st.session_state.import_jobs_aktif = True
+                            st.rerun()
 
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
@@ -1586,24 +1571,21 @@ elif menu == "💰 Kelola HPP":
         st.subheader("🗑️ Hapus Data HPP")
         st.warning("⚠️ Penghapusan data HPP bersifat permanen!")
 
-        df_hpp = get_hpp_data()
-
-        if not df_hpp.empty:
+        if db.has_rows("hpp"):
             col1, col2 = st.columns(2)
             with col1:
                 filter_unit_delete = st.selectbox("🏠 Filter Unit", ["Semua"] + generate_unit_options(), key="delete_unit_filter")
             with col2:
                 search_material_delete = st.text_input("🔍 Cari Material", key="delete_material_search")
 
-            df_filtered = df_hpp.copy()
-            if filter_unit_delete != "Semua":
-                df_filtered = df_filtered[df_filtered['unit'] == filter_unit_delete]
-            if search_material_delete:
-                df_filtered = df_filtered[df_filtered['material'].str.contains(search_material_delete, case=False, na=False)]
+            # hanya satu halaman (keyset) yang dibaca, bukan seluruh data HPP
+            where, params = hpp_filters(filter_unit_delete, search=search_material_delete)
+            df_filtered = paginated_history("hapus_hpp", "hpp", "tanggal", where, params)
 
             if not df_filtered.empty:
-                hpp_options = {f"ID-{row['id']}: {row['unit']} - {row['material']} - Rp {row['harga']:,.0f} ({row['tanggal']})": row['id']
-                               for _, row in df_filtered.iterrows()}
+                tanggal = pd.to_datetime(df_filtered['tanggal'], format='ISO8601').dt.strftime('%d/%m/%Y')
+                hpp_options = {f"ID-{row['id']}: {row['unit']} - {row['material']} - Rp {row['harga']:,.0f} ({tanggal[idx]})": row['id']
+                               for idx, row in df_filtered.iterrows()}
 
                 with st.form("form_hapus_hpp"):
                     selected_hpp = st.selectbox("🗑️ Pilih data yang akan dihapus", list(hpp_options.keys()))
@@ -1659,19 +1641,15 @@ elif menu == "💰 Laporan HPP":
             )
 
         # --- Ambil data sesuai filter ---
-        df_hpp_filtered = get_hpp_data(
-            unit=None if selected_unit_hpp == "Semua Unit" else selected_unit_hpp,
-            start_date=start_date_hpp,
-            end_date=end_date_hpp
-        )
-
-        if not df_hpp_filtered.empty:
-            df_hpp_filtered['tanggal'] = pd.to_datetime(
-                df_hpp_filtered['tanggal'], errors='coerce', dayfirst=True
-            ).dt.strftime('%d/%m/%Y')
+        unit_hpp = None if selected_unit_hpp == "Semua Unit" else selected_unit_hpp
+        where, params = hpp_filters(unit_hpp, start_date_hpp, end_date_hpp)
+        totals = cached_query(
+            "SELECT COUNT(*) AS jumlah_transaksi, COALESCE(SUM(harga), 0) AS total_hpp FROM hpp" + where,
+            params).iloc[0]
 
-            total_hpp = df_hpp_filtered['harga'].sum()
-            jumlah_transaksi = len(df_hpp_filtered)
+        if totals['jumlah_transaksi'] > 0:
+            total_hpp = totals['total_hpp']
+            jumlah_transaksi = int(totals['jumlah_transaksi'])
 
             col1, col2 = st.columns(2)
             with col1:
@@ -1679,22 +1657,21 @@ elif menu == "💰 Laporan HPP":
             with col2:
                 st.metric("📝 Jumlah Transaksi", jumlah_transaksi)
 
+            df_page = paginated_history("laporan_hpp_unit", "hpp", "tanggal", where, params)
+            df_page['tanggal'] = pd.to_datetime(df_page['tanggal'], format='%Y-%m-%d', errors='coerce').dt.strftime('%d/%m/%Y')
             st.dataframe(
-                df_hpp_filtered[['id', 'unit', 'tanggal', 'material', 'harga', 'keterangan']],
+                df_page[['id', 'unit', 'tanggal', 'material', 'harga', 'keterangan']],
                 width="stretch"
             )
-            create_excel_download(
-                df_hpp_filtered[['id', 'unit', 'tanggal', 'material', 'harga', 'keterangan']],
+            create_lazy_excel_download(
+                "laporan_hpp_unit",
+                lambda: get_hpp_data(unit_hpp, start_date_hpp, end_date_hpp)[['id', 'unit', 'tanggal', 'material', 'harga', 'keterangan']],
                 "laporan_hpp_unit",
                 "📥 Download Excel"
             )
-            chart_data = (
-                df_hpp_filtered.groupby('material')['harga']
-                .sum()
-                .reset_index()
-                .sort_values('harga', ascending=False)
-                .head(10)
-            )
+            chart_data = cached_query(
+                "SELECT material, SUM(harga) AS harga FROM hpp" + where +
+                " GROUP BY material ORDER BY harga DESC LIMIT 10", params)
             fig = px.bar(
                 chart_data,
                 x='material',
@@ -1710,34 +1687,20 @@ elif menu == "💰 Laporan HPP":
     with tab2:
         st.subheader("📈 Laporan HPP Periode")
 
-        df_hpp = get_hpp_data()
-
-        if not df_hpp.empty:
-            # konversi tanggal ke datetime dayfirst agar sesuai format dd/mm/yyyy
-            df_hpp['tanggal'] = pd.to_datetime(
-                df_hpp['tanggal'], errors='coerce', dayfirst=True
-            )
-
+        if db.has_rows("hpp"):
             # Filter Unit
             filter_unit = st.selectbox(
                 "🏠 Pilih Unit",
-                ["Semua"] + sorted(df_hpp['unit'].dropna().unique().tolist()),
+                ["Semua"] + get_hpp_units(),
                 key="filter_unit_periode"
             )
-            if filter_unit != "Semua":
-                df_hpp = df_hpp[df_hpp['unit'] == filter_unit]
-
-            # Tambah kolom bulan (format Month/Year)
-            df_hpp['bulan'] = df_hpp['tanggal'].dt.strftime('%m/%Y')
+            where, params = build_filters(unit=filter_unit)
 
             # Laporan Bulanan
             st.markdown("### 📅 Laporan Bulanan")
-            monthly_data = (
-                df_hpp.groupby(['bulan', 'unit'])['harga']
-                .sum()
-                .reset_index()
-                .rename(columns={'bulan': 'Bulan', 'unit': 'Unit', 'harga': 'Total HPP'})
-            )
+            monthly_data = cached_query(
+                "SELECT substr(bulan, 6, 2) || '/' || substr(bulan, 1, 4) AS Bulan, unit AS Unit, total AS 'Total HPP'"
+                " FROM hpp_bulanan" + where + " ORDER BY bulan, unit", params)
 
             if not monthly_data.empty:
                 st.dataframe(monthly_data, width="stretch")
@@ -1762,20 +1725,10 @@ elif menu == "💰 Laporan HPP":
 
             # Ringkasan per Unit
             st.markdown("### 🏠 Ringkasan per Unit")
-            unit_summary = (
-                df_hpp.groupby('unit')['harga']
-                .agg(['sum', 'count', 'mean'])
-                .reset_index()
-                .rename(
-                    columns={
-                        'unit': 'Unit',
-                        'sum': 'Total HPP',
-                        'count': 'Jumlah Transaksi',
-                        'mean': 'Rata-rata HPP'
-                    }
-                )
-                .sort_values('Total HPP', ascending=False)
-            )
+            unit_summary = cached_query(
+                "SELECT unit AS Unit, SUM(total) AS 'Total HPP', SUM(jumlah) AS 'Jumlah Transaksi',"
+                " SUM(total) / SUM(jumlah) AS 'Rata-rata HPP'"
+                " FROM hpp_bulanan" + where + " GROUP BY unit ORDER BY 2 DESC", params)
 
             st.dataframe(unit_summary, width="stretch")
 
@@ -1800,31 +1753,24 @@ elif menu == "💰 Laporan HPP":
     with tab3:
         st.subheader("📋 Ringkasan Total")
 
-        df_hpp = get_hpp_data()
-
-        if not df_hpp.empty:
-            # Konversi tanggal string ke datetime untuk keperluan analisis
-            df_hpp['tanggal'] = pd.to_datetime(df_hpp['tanggal'], errors='coerce', dayfirst=True)
-
+        if db.has_rows("hpp"):
             # Filter Unit
             filter_unit_total = st.selectbox(
                 "🏠 Pilih Unit",
-                ["Semua"] + sorted(df_hpp['unit'].dropna().unique().tolist()),
+                ["Semua"] + get_hpp_units(),
                 key="filter_unit_total"
             )
-
-            if filter_unit_total != "Semua":
-                df_hpp = df_hpp[df_hpp['unit'] == filter_unit_total]
-
-            # Pastikan tanggal ditampilkan kembali dalam format dd/mm/yyyy
-            df_hpp['tanggal'] = df_hpp['tanggal'].dt.strftime('%d/%m/%Y')
-
-            # Hitung metrik ringkasan
-            total_hpp_all = df_hpp['harga'].sum()
-            total_transaksi = len(df_hpp)
-            rata_rata_hpp = df_hpp['harga'].mean()
-            hpp_tertinggi = df_hpp['harga'].max()
-            hpp_terendah = df_hpp['harga'].min()
+            where, params = build_filters(unit=filter_unit_total)
+
+            # Hitung metrik ringkasan dari ringkasan per unit x bulan
+            ringkasan = cached_query(
+                "SELECT SUM(total) AS total, SUM(jumlah) AS jumlah, MAX(harga_max) AS tertinggi, MIN(harga_min) AS terendah"
+                " FROM hpp_bulanan" + where, params).iloc[0]
+            total_hpp_all = ringkasan['total'] or 0
+            total_transaksi = int(ringkasan['jumlah'] or 0)
+            rata_rata_hpp = total_hpp_all / total_transaksi if total_transaksi else 0
+            hpp_tertinggi = ringkasan['tertinggi'] or 0
+            hpp_terendah = ringkasan['terendah'] or 0
 
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -1838,13 +1784,9 @@ elif menu == "💰 Laporan HPP":
 
             # 🔝 Top Material
             st.markdown("### 🔝 Top 15 Material dengan HPP Tertinggi")
-            top_materials = (
-                df_hpp.groupby('material')['harga']
-                .sum()
-                .reset_index()
-                .sort_values('harga', ascending=False)
-                .head(15)
-            )
+            top_materials = cached_query(
+                "SELECT material, SUM(total) AS harga FROM hpp_material" + where +
+                " GROUP BY material ORDER BY harga DESC LIMIT 15", params)
             top_materials['harga_formatted'] = top_materials['harga'].apply(lambda x: f"Rp {x:,.0f}".replace(",", "."))
 
             st.dataframe(top_materials[['material', 'harga_formatted']], width="stretch")
@@ -1935,8 +1877,12 @@ elif menu == "📥 Import/Export Data":
 
         if uploaded_file_barang is not None:
             try:
-                excel_file = pd.ExcelFile(uploaded_file_barang)
-                sheet_names = excel_file.sheet_names
+                stream_barang = streaming_mode(uploaded_file_barang, key="stream_barang")
+                if stream_barang:
+                    sheets = read_weekly_preview(uploaded_file_barang, day_row=3)
+                else:
+                    sheets, sheet_cells = read_weekly_workbook(uploaded_file_barang, day_row=3)
+                sheet_names = list(sheets)
 
                 st.success(f"✅ File berhasil diupload! Ditemukan {len(sheet_names)} sheet.")
 
@@ -1979,50 +1925,9 @@ elif menu == "📥 Import/Export Data":
                                     key=f"gudang_barang_{sheet_name}"
                                 )
 
-                            # Preview data dengan multi-header
-                            try:
-                                df_row3 = pd.read_excel(uploaded_file_barang, sheet_name=sheet_name, header=2, nrows=0)
-                                header_row3 = df_row3.columns.tolist()
-
-                                df_row4 = pd.read_excel(uploaded_file_barang, sheet_name=sheet_name, header=3, nrows=0)
-                                header_row4 = df_row4.columns.tolist()
-
-                                combined_header = []
-                                num_cols = max(len(header_row3), len(header_row4))
-
-                                for i in range(num_cols):
-                                    h3 = header_row3[i] if i < len(header_row3) else ''
-                                    h4 = header_row4[i] if i < len(header_row4) else ''
-
-                                    h3_clean = str(h3).lower().strip().replace(' ', '')
-                                    h4_clean = str(h4).lower().strip().replace(' ', '')
-
-                                    if i == 0:
-                                        combined_header.append('skip_a')
-                                    elif i == 1:
-                                        combined_header.append('namabarang')
-                                    elif i == 2:
-                                        combined_header.append('skip_jumlah')
-                                    elif i == 3:
-                                        combined_header.append('satuan')
-                                    elif h4_clean in ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']:
-                                        combined_header.append(h4_clean)
-                                    else:
-                                        combined_header.append('skip_' + str(i))
-
-                                df_preview = pd.read_excel(uploaded_file_barang, sheet_name=sheet_name, header=None, skiprows=4, nrows=5)
-
-                                num_data_cols = len(df_preview.columns)
-                                if len(combined_header) >= num_data_cols:
-                                    df_preview.columns = combined_header[:num_data_cols]
-                                else:
-                                    df_preview.columns = combined_header + [f'extra_{j}' for j in range(len(combined_header), num_data_cols)]
-
-                                st.write("**Preview Data (5 Baris Pertama):**")
-                                st.dataframe(df_preview.head(5), use_container_width=True)
-
-                            except Exception as e:
-                                st.error(f"Error membaca preview: {str(e)}")
+                            # Preview data dengan multi-header (dari cache workbook)
+                            st.write("**Preview Data (5 Baris Pertama):**")
+                            st.dataframe(sheets[sheet_name].head(5), use_container_width=True)
 
                             st.session_state.import_barang_config[sheet_name] = {
                                 'tanggal_senin': tanggal_senin,
@@ -2042,148 +1947,18 @@ elif menu == "📥 Import/Export Data":
                             st.error("❌ Tidak ada sheet yang dipilih untuk diimpor!")
                             st.stop()
 
-                        with st.spinner("Memproses import data barang masuk..."):
-                            total_imported = 0
-                            total_updated = 0
-                            errors = []
-
-                            conn = sqlite3.connect('inventory_rumah.db')
-                            c = conn.cursor()
-
-                            for sheet_name in selected_sheets_barang:
-                                try:
-                                    # Baca multi-header
-                                    df_row3 = pd.read_excel(uploaded_file_barang, sheet_name=sheet_name, header=2, nrows=0)
-                                    header_row3 = df_row3.columns.tolist()
-
-                                    df_row4 = pd.read_excel(uploaded_file_barang, sheet_name=sheet_name, header=3, nrows=0)
-                                    header_row4 = df_row4.columns.tolist()
-
-                                    combined_header = []
-                                    num_cols = max(len(header_row3), len(header_row4))
-
-                                    for i in range(num_cols):
-                                        h3 = header_row3[i] if i < len(header_row3) else ''
-                                        h4 = header_row4[i] if i < len(header_row4) else ''
-
-                                        h3_clean = str(h3).lower().strip().replace(' ', '')
-                                        h4_clean = str(h4).lower().strip().replace(' ', '')
-
-                                        if i == 0:
-                                            combined_header.append('skip_a')
-                                        elif i == 1:
-                                            combined_header.append('namabarang')
-                                        elif i == 2:
-                                            combined_header.append('skip_jumlah')
-                                        elif i == 3:
-                                            combined_header.append('satuan')
-                                        elif h4_clean in ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']:
-                                            combined_header.append(h4_clean)
-                                        else:
-                                            combined_header.append('skip_' + str(i))
-
-                                    df = pd.read_excel(uploaded_file_barang, sheet_name=sheet_name, header=None, skiprows=4)
-                                    num_data_cols = len(df.columns)
-
-                                    if len(combined_header) >= num_data_cols:
-                                        df.columns = combined_header[:num_data_cols]
-                                    else:
-                                        df.columns = combined_header + [f'extra_{j}' for j in range(len(combined_header), num_data_cols)]
-
-                                    config = st.session_state.import_barang_config.get(sheet_name)
-                                    if not config:
-                                        errors.append(f"Sheet '{sheet_name}': Konfigurasi tidak ditemukan.")
-                                        continue
-
-                                    tanggal_senin = config['tanggal_senin']
-                                    gudang = config['gudang']
-
-                                    hari_cols = ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']
-
-                                    for idx, row in df.iterrows():
-                                        nama_barang = str(row.get('namabarang', '')).strip()
-                                        satuan = str(row.get('satuan', '')).strip()
-
-                                        if not nama_barang or nama_barang == 'nan':
-                                            continue
-
-                                        if not satuan or satuan == 'nan':
-                                            satuan = 'pcs'
-
-                                        for day_idx, hari in enumerate(hari_cols):
-                                            if hari not in df.columns:
-                                                continue
-
-                                            jumlah = row.get(hari, 0)
-
-                                            try:
-                                                if pd.isna(jumlah) or jumlah is None or str(jumlah).strip() == '':
-                                                    jumlah = 0
-                                                else:
-                                                    jumlah = int(float(jumlah))
-                                            except Exception:
-                                                jumlah = 0
-
-                                            if jumlah <= 0:
-                                                continue
-
-                                            tanggal_masuk = tanggal_senin + timedelta(days=day_idx)
-
-                                            c.execute("SELECT id, stok FROM barang WHERE LOWER(nama_barang) = LOWER(?) AND LOWER(gudang) = LOWER(?)",
-                                                      (nama_barang, gudang))
-                                            existing = c.fetchone()
-
-                                            if existing:
-                                                # Update stok yang sudah ada
-                                                barang_id, stok_lama = existing
-                                                stok_baru = stok_lama + jumlah
-                                                c.execute("UPDATE barang SET stok = ?, besaran_stok = ? WHERE id = ?",
-                                                          (stok_baru, satuan, barang_id))
-
-                                                # Catat riwayat
-                                                c.execute("""INSERT INTO riwayat_stok
-                                                            (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
-                                                            VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                                                            (barang_id, nama_barang, jumlah, stok_lama, stok_baru, gudang, tanggal_masuk))
-
-                                                total_updated += 1
-                                            else:
-                                                # Tambah barang baru
-                                                c.execute("INSERT INTO barang (nama_barang, stok, besaran_stok, gudang, created_at) VALUES (?, ?, ?, ?, ?)",
-                                                          (nama_barang, jumlah, satuan, gudang, tanggal_masuk))
-
-                                                barang_id = c.lastrowid
-
-                                                # Catat riwayat
-                                                c.execute("""INSERT INTO riwayat_stok
-                                                            (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
-                                                            VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                                                            (barang_id, nama_barang, jumlah, 0, jumlah, gudang, tanggal_masuk))
-
-                                                total_imported += 1
-
-                                except Exception as e:
-                                    errors.append(f"Sheet '{sheet_name}': {str(e)}")
-
-                            conn.commit()
-                            conn.close()
-                            upload_after_write(LOCAL_DB)
-
-                            if total_imported > 0 or total_updated > 0:
-                                st.success(f"✅ Berhasil import barang masuk! **{total_imported}** barang baru dan **{total_updated}** penambahan stok!")
-                                st.balloons()
-                            else:
-                                st.warning("⚠️ Tidak ada barang yang berhasil diimport. Cek format file Excel Anda.")
-
-                            if errors:
-                                st.error("⚠️ Beberapa **error** terjadi selama import:")
-                                for error in errors:
-                                    st.write(f"- {error}")
+                        # import berjalan di thread job; progress & hasil tampil di sidebar
+                        sheets_config = [(name, st.session_state.import_barang_config.get(name)) for name in selected_sheets_barang]
+                        if stream_barang:
+                            job = barang_masuk_job(sheets_config, source=uploaded_file_barang.getvalue())
+                        else:
+                            job = barang_masuk_job(sheets_config, sheet_cells=sheet_cells)
+                        jobs.submit('barang_masuk', uploaded_file_barang.name, job)
+                        st.session_state.import_jobs_aktif = True
 
-                            st.session_state.import_barang_config = {}
-                            st.session_state.selected_sheets_barang = {}
-                            time.sleep(2)
-                            st.rerun()
+                        st.session_state.import_barang_config = {}
+                        st.session_state.selected_sheets_barang = {}
+                        st.rerun()
 
             except Exception as e:
                 st.error(f"❌ Error membaca file: {str(e)}")
@@ -2207,8 +1982,12 @@ elif menu == "📥 Import/Export Data":
 
         if uploaded_file is not None:
             try:
-                excel_file = pd.ExcelFile(uploaded_file)
-                sheet_names = excel_file.sheet_names
+                stream_penggunaan = streaming_mode(uploaded_file, key="stream_penggunaan")
+                if stream_penggunaan:
+                    sheets = read_weekly_preview(uploaded_file, day_row=2)
+                else:
+                    sheets, sheet_cells = read_weekly_workbook(uploaded_file, day_row=2)
+                sheet_names = list(sheets)
 
                 st.success(f"✅ File berhasil diupload! Ditemukan {len(sheet_names)} sheet.")
 
@@ -2253,49 +2032,9 @@ elif menu == "📥 Import/Export Data":
                                     help="Pilih tanggal hari Senin dari minggu data ini"
                                 )
 
-                            try:
-                                df_row2 = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=1, nrows=0)
-                                header_row2 = df_row2.columns.tolist()
-
-                                df_row3 = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=2, nrows=0)
-                                header_row3 = df_row3.columns.tolist()
-
-                                combined_header = []
-                                num_cols = max(len(header_row2), len(header_row3))
-
-                                for i in range(num_cols):
-                                    h2 = header_row2[i] if i < len(header_row2) else ''
-                                    h3 = header_row3[i] if i < len(header_row3) else ''
-
-                                    h2_clean = str(h2).lower().strip().replace(' ', '')
-                                    h3_clean = str(h3).lower().strip().replace(' ', '')
-
-                                    if i == 0:
-                                        combined_header.append('skip_a')
-                                    elif i == 1:
-                                        combined_header.append('namabarang')
-                                    elif i == 2:
-                                        combined_header.append('skip_jumlah')
-                                    elif i == 3:
-                                        combined_header.append('satuan')
-                                    elif h3_clean in ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']:
-                                        combined_header.append(h3_clean)
-                                    else:
-                                        combined_header.append('skip_' + str(i))
-
-                                df_preview = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None, skiprows=3, nrows=5)
-
-                                num_data_cols = len(df_preview.columns)
-                                if len(combined_header) >= num_data_cols:
-                                    df_preview.columns = combined_header[:num_data_cols]
-                                else:
-                                    df_preview.columns = combined_header + [f'extra_{j}' for j in range(len(combined_header), num_data_cols)]
-
-                                st.write("**Preview Data (5 Baris Pertama):**")
-                                st.dataframe(df_preview.head(5), use_container_width=True)
-
-                            except Exception as e:
-                                st.error(f"Error membaca preview: {str(e)}")
+                            # Preview data dengan multi-header (dari cache workbook)
+                            st.write("**Preview Data (5 Baris Pertama):**")
+                            st.dataframe(sheets[sheet_name].head(5), use_container_width=True)
 
                             st.session_state.import_config[sheet_name] = {
                                 'unit': unit,
@@ -2315,144 +2054,24 @@ elif menu == "📥 Import/Export Data":
                             st.error("❌ Tidak ada sheet yang dipilih untuk diimpor!")
                             st.stop()
 
-                        with st.spinner("Memproses import data..."):
-                            total_imported = 0
-                            errors = []
-
-                            conn = sqlite3.connect('inventory_rumah.db')
-                            c = conn.cursor()
-
-                            for sheet_name in st.session_state.selected_sheets_for_import:
-                                config = st.session_state.import_config.get(sheet_name)
-                                if not config or not config.get('unit') or not config['unit'].strip():
-                                    st.error(f"❌ Unit untuk sheet '{sheet_name}' wajib diisi!")
-                                    st.stop()
-                                try:
-                                    df_row2 = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=1, nrows=0)
-                                    header_row2 = df_row2.columns.tolist()
-
-                                    df_row3 = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=2, nrows=0)
-                                    header_row3 = df_row3.columns.tolist()
-
-                                    combined_header = []
-                                    num_cols = max(len(header_row2), len(header_row3))
-
-                                    for i in range(num_cols):
-                                        h2 = header_row2[i] if i < len(header_row2) else ''
-                                        h3 = header_row3[i] if i < len(header_row3) else ''
-
-                                        h2_clean = str(h2).lower().strip().replace(' ', '')
-                                        h3_clean = str(h3).lower().strip().replace(' ', '')
-
-                                        if i == 0:
-                                            combined_header.append('skip_a')
-                                        elif i == 1:
-                                            combined_header.append('namabarang')
-                                        elif i == 2:
-                                            combined_header.append('skip_jumlah')
-                                        elif i == 3:
-                                            combined_header.append('satuan')
-                                        elif h3_clean in ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']:
-                                            combined_header.append(h3_clean)
-                                        else:
-                                            combined_header.append('skip_' + str(i))
-
-                                    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None, skiprows=3)
-                                    num_data_cols = len(df.columns)
-
-                                    if len(combined_header) >= num_data_cols:
-                                        df.columns = combined_header[:num_data_cols]
-                                    else:
-                                        df.columns = combined_header + [f'extra_{j}' for j in range(len(combined_header), num_data_cols)]
-
-                                    config = st.session_state.import_config.get(sheet_name)
-                                    if not config:
-                                        errors.append(f"Sheet '{sheet_name}': Konfigurasi tidak ditemukan.")
-                                        continue
-
-                                    unit = config['unit']
-                                    tanggal_senin = config['tanggal_senin']
-
-                                    hari_cols = ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']
-
-                                    for idx, row in df.iterrows():
-                                        nama_barang = str(row.get('namabarang', '')).strip()
-                                        satuan = str(row.get('satuan', '')).strip()
-
-                                        if not nama_barang or nama_barang == 'nan':
-                                            continue
-
-                                        if not satuan or satuan == 'nan':
-                                            satuan = 'pcs'
-
-                                        for day_idx, hari in enumerate(hari_cols):
-                                            if hari not in df.columns:
-                                                continue
-
-                                            jumlah = row.get(hari, 0)
-
-                                            try:
-                                                if pd.isna(jumlah) or jumlah is None or str(jumlah).strip() == '':
-                                                    jumlah = 0
-                                                else:
-                                                    jumlah = int(float(jumlah))
-                                            except Exception:
-                                                jumlah = 0
-
-                                            if jumlah <= 0:
-                                                continue
-
-                                            tanggal_penggunaan = tanggal_senin + timedelta(days=day_idx)
-
-                                            # --- Tambah ke tabel peminjaman seperti biasa ---
-                                            c.execute("""INSERT INTO peminjaman
-                                                            (barang_id, nama_barang, jumlah_pinjam, tanggal_pinjam,
-                                                            unit, besaran_stok, gudang)
-                                                            VALUES (NULL, ?, ?, ?, ?, ?, 'Gudang 1')""",
-                                                        (nama_barang, jumlah, tanggal_penggunaan, unit, satuan))
-
-                                            # --- Kurangi stok langsung berdasarkan nama barang ---
-                                            c.execute("SELECT id, stok, gudang FROM barang WHERE LOWER(nama_barang) = LOWER(?)", (nama_barang,))
-                                            barang_data = c.fetchone()
-
-                                            if barang_data:
-                                                barang_id, stok_sekarang, gudang = barang_data
-                                                stok_baru = stok_sekarang - jumlah
-                                                if stok_baru < 0:
-                                                    stok_baru = 0
-
-                                                c.execute("UPDATE barang SET stok = ? WHERE id = ?", (stok_baru, barang_id))
-
-                                                # Tambahkan riwayat stok sebagai pengurangan
-                                                c.execute("""
-                                                    INSERT INTO riwayat_stok
-                                                    (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
-                                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                                """, (barang_id, nama_barang, -jumlah, stok_sekarang, stok_baru, gudang, tanggal_penggunaan))
-
-                                            total_imported += 1
-
-                                except Exception as e:
-                                    errors.append(f"Sheet '{sheet_name}': {str(e)}")
-
-                            conn.commit()
-                            conn.close()
-
-                            if total_imported > 0:
-                                st.success(f"✅ Berhasil import **{total_imported}** transaksi penggunaan dari {len(st.session_state.selected_sheets_for_import)} sheet!")
-                                st.balloons()
-                            else:
-                                st.warning("⚠️ Tidak ada transaksi yang berhasil diimport. Cek format file Excel Anda.")
+                        for sheet_name in st.session_state.selected_sheets_for_import:
+                            config = st.session_state.import_config.get(sheet_name)
+                            if not config or not config.get('unit') or not config['unit'].strip():
+                                st.error(f"❌ Unit untuk sheet '{sheet_name}' wajib diisi!")
+                                st.stop()
 
-                            if errors:
-                                st.error("⚠️ Beberapa **error** terjadi selama import:")
-                                for error in errors:
-                                    st.write(f"- {error}")
+                        # import berjalan di thread job; progress & hasil tampil di sidebar
+                        sheets_config = [(name, st.session_state.import_config[name]) for name in st.session_state.selected_sheets_for_import]
+                        if stream_penggunaan:
+                            job = penggunaan_job(sheets_config, source=uploaded_file.getvalue())
+                        else:
+                            job = penggunaan_job(sheets_config, sheet_cells=sheet_cells)
+                        jobs.submit('penggunaan', uploaded_file.name, job)
+                        st.session_state.import_jobs_aktif = True
 
-                            st.session_state.import_config = {}
-                            st.session_state.selected_sheets = {}
-                            time.sleep(2)
-                            st.rerun()
+                        st.session_state.import_config = {}
+                        st.session_state.selected_sheets = {}
+                        st.rerun()
 
             except Exception as e:
                 st.error(f"❌ Error membaca file: {str(e)}")
@@ -2500,7 +2119,7 @@ elif menu == "📥 Import/Export Data":
                     ]
 
                     output = BytesIO()
-                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                    with pd.ExcelWriter(output, engine='xlsxwriter', **EXCEL_DATE_FORMATS) as writer:
                         for sheet_name, df in sheets_to_export:
                             if not df.empty:
                                 df.to_excel(writer, sheet_name=sheet_name, index=False)
@@ -2537,8 +2156,7 @@ elif menu == "📥 Import/Export Data":
 
             if st.session_state.get('ready_to_download_db'):
                 try:
-                    with open('inventory_rumah.db', 'rb') as f:
-                        db_data = f.read()
+                    db_data = db.backup_bytes()
 
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     filename = f"inventory_database_{timestamp}.db"
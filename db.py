@@ -0,0 +1,431 @@
+# ================= DATA ACCESS =================
+# Semua query aplikasi lewat modul ini. Koneksi SQLite di-cache per thread dan
+# pragma tuning (WAL, synchronous, busy_timeout, mmap, cache) diatur di satu
+# tempat. Lokasi database diambil dari st.secrets["DB_PATH"] (default
+# inventory_rumah.db di folder aplikasi).
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+
+def get_resource_path(relative_path):
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+DB_PATH = get_resource_path(st.secrets.get("DB_PATH", "inventory_rumah.db"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-32000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_local = threading.local()
+_conn_lock = threading.Lock()
+_connections = []
+# dinaikkan setiap commit yang mengubah data; dipakai sebagai kunci cache query
+_cache_version = {"value": 0}
+
+def _open_connection():
+    # isolation_level=None: transaksi diatur eksplisit oleh transaction()
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _open_connection()
+        _local.conn = conn
+        with _conn_lock:
+            # tutup koneksi milik thread script yang sudah selesai
+            for thread, old_conn in [item for item in _connections if not item[0].is_alive()]:
+                old_conn.close()
+                _connections.remove((thread, old_conn))
+            _connections.append((threading.current_thread(), conn))
+    return conn
+
+def cache_version():
+    return _cache_version["value"]
+
+def bump_cache_version():
+    with _conn_lock:
+        _cache_version["value"] += 1
+
+@contextmanager
+def transaction():
+    conn = get_conn()
+    if conn.in_transaction:
+        # transaksi bersarang ikut transaksi luar
+        yield conn.cursor()
+        return
+    changes_before = conn.total_changes
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+        conn.execute("COMMIT")
+    except BaseException:
+        # termasuk st.stop()/st.rerun() di tengah proses import
+        conn.execute("ROLLBACK")
+        raise
+    if conn.total_changes != changes_before:
+        bump_cache_version()
+
+def read_df(sql, params=()):
+    return pd.read_sql_query(sql, get_conn(), params=params)
+
+# Tipe kolom hasil baca, berlaku untuk kolom bernama sama di tabel mana pun.
+# Dikonversi sekali per kolom (vektor) saat dibaca, jadi halaman tidak perlu
+# mem-parse ulang tanggal; teks berulang disimpan sebagai category.
+DATE_COLUMNS = ('tanggal_pinjam', 'tanggal_tambah', 'created_at')
+CATEGORY_COLUMNS = ('gudang', 'unit', 'besaran_stok')
+INT_COLUMNS = ('id', 'barang_id', 'stok', 'jumlah_pinjam', 'jumlah_tambah', 'stok_sebelum', 'stok_sesudah')
+
+def read_typed(sql, params=()):
+    df = read_df(sql, params)
+    for col in df.columns.intersection(DATE_COLUMNS):
+        df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+    for col in df.columns.intersection(CATEGORY_COLUMNS):
+        df[col] = df[col].astype('category')
+    for col in df.columns.intersection(INT_COLUMNS):
+        # int32 cukup untuk id/jumlah; kolom dengan NULL menjadi float
+        df[col] = df[col].astype('int32') if df[col].notna().all() else pd.to_numeric(df[col])
+    return df
+
+def fetchone(sql, params=()):
+    return get_conn().execute(sql, params).fetchone()
+
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+def to_iso_date(value):
+    # format simpan tanggal HPP: YYYY-MM-DD. ValueError jika tidak bisa dibaca.
+    if isinstance(value, str):
+        text = value.strip()
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S"):
+            try:
+                return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+        parsed = pd.to_datetime(text, errors="coerce", dayfirst=True)
+    else:
+        parsed = pd.to_datetime(value, errors="coerce")
+    if pd.isna(parsed):
+        raise ValueError(f"Tanggal tidak valid: {value!r}")
+    return parsed.strftime("%Y-%m-%d")
+
+def has_rows(table):
+    return fetchone(f"SELECT EXISTS (SELECT 1 FROM {table})")[0] == 1
+
+def backup_bytes():
+    # salinan konsisten (termasuk isi WAL) untuk tombol download file .db
+    fd, tmp_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        dst = sqlite3.connect(tmp_path)
+        try:
+            get_conn().backup(dst)
+        finally:
+            dst.close()
+        with open(tmp_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+# ================= RINGKASAN PENGGUNAAN =================
+# peminjaman_harian / peminjaman_bulanan menyimpan total penggunaan per
+# (periode, barang, satuan, unit). Setiap penulis tabel peminjaman memanggil
+# apply_usage_rollup() di transaksi yang sama, jadi laporan cukup membaca
+# ringkasan yang ukurannya tergantung jumlah barang x periode, bukan transaksi.
+
+USAGE_ROLLUPS = (
+    ("peminjaman_harian", "tanggal", "substr(tanggal_pinjam, 1, 10)"),
+    ("peminjaman_bulanan", "bulan", "substr(tanggal_pinjam, 1, 7)"),
+)
+
+def apply_usage_rollup(c, where, params=(), sign=1):
+    # sign=1 menambahkan baris peminjaman yang cocok dengan `where` ke
+    # ringkasan; sign=-1 mengurangkannya (panggil sebelum baris dihapus)
+    for table, period_col, period_expr in USAGE_ROLLUPS:
+        c.execute(f"""INSERT INTO {table} ({period_col}, nama_barang, besaran_stok, unit, jumlah, transaksi)
+                      SELECT {period_expr}, nama_barang, besaran_stok, unit, ? * SUM(jumlah_pinjam), ? * COUNT(*)
+                      FROM peminjaman WHERE {where}
+                      GROUP BY 1, 2, 3, 4
+                      ON CONFLICT ({period_col}, nama_barang, besaran_stok, unit) DO UPDATE SET
+                          jumlah = jumlah + excluded.jumlah,
+                          transaksi = transaksi + excluded.transaksi""", (sign, sign, *params))
+        if sign < 0:
+            c.execute(f"""DELETE FROM {table}
+                          WHERE transaksi <= 0 AND ({period_col}, nama_barang, besaran_stok, unit) IN
+                              (SELECT {period_expr}, nama_barang, besaran_stok, unit FROM peminjaman WHERE {where})""", params)
+
+# ================= RINGKASAN HPP =================
+# hpp_bulanan (per unit x bulan) dan hpp_material (per unit x material)
+# menyimpan total, jumlah, min dan max harga. Insert cukup upsert; hapus
+# lewat delete_hpp_rows() supaya min/max dihitung ulang bila perlu.
+
+HPP_ROLLUPS = (
+    ("hpp_bulanan", "bulan", "substr(tanggal, 1, 7)"),
+    ("hpp_material", "material", "material"),
+)
+
+def apply_hpp_rollup(c, where, params=()):
+    # tambahkan baris hpp yang cocok dengan `where` ke ringkasan
+    for table, key_col, key_expr in HPP_ROLLUPS:
+        c.execute(f"""INSERT INTO {table} (unit, {key_col}, total, jumlah, harga_min, harga_max)
+                      SELECT unit, {key_expr}, SUM(harga), COUNT(*), MIN(harga), MAX(harga)
+                      FROM hpp WHERE {where}
+                      GROUP BY 1, 2
+                      ON CONFLICT (unit, {key_col}) DO UPDATE SET
+                          total = total + excluded.total,
+                          jumlah = jumlah + excluded.jumlah,
+                          harga_min = MIN(harga_min, excluded.harga_min),
+                          harga_max = MAX(harga_max, excluded.harga_max)""", params)
+
+def _hpp_group_filter(key_col, unit, key):
+    if key_col == "bulan":
+        # rentang tanggal supaya index hpp (unit, tanggal) terpakai
+        return "unit = ? AND tanggal >= ? AND tanggal < ?", (unit, key + "-01", key + "-32")
+    return "unit = ? AND material = ?", (unit, key)
+
+def delete_hpp_rows(c, where, params=()):
+    removed = {
+        table: c.execute(f"""SELECT unit, {key_expr}, SUM(harga), COUNT(*), MIN(harga), MAX(harga)
+                             FROM hpp WHERE {where} GROUP BY 1, 2""", params).fetchall()
+        for table, key_col, key_expr in HPP_ROLLUPS
+    }
+    ledger_forget(c, 'hpp', where, params)
+    c.execute(f"DELETE FROM hpp WHERE {where}", params)
+    for table, key_col, key_expr in HPP_ROLLUPS:
+        for unit, key, total, jumlah, harga_min, harga_max in removed[table]:
+            key_where = f"unit = ? AND {key_col} = ?"
+            c.execute(f"UPDATE {table} SET total = total - ?, jumlah = jumlah - ? WHERE {key_where}",
+                      (total, jumlah, unit, key))
+            row = c.execute(f"SELECT jumlah, harga_min, harga_max FROM {table} WHERE {key_where}", (unit, key)).fetchone()
+            if row is None:
+                continue
+            if row[0] <= 0:
+                c.execute(f"DELETE FROM {table} WHERE {key_where}", (unit, key))
+            elif harga_min <= row[1] or harga_max >= row[2]:
+                # nilai ekstrem kelompok ini ikut terhapus: hitung ulang dari sisa baris
+                group_where, group_params = _hpp_group_filter(key_col, unit, key)
+                c.execute(f"""UPDATE {table} SET (harga_min, harga_max) =
+                                  (SELECT MIN(harga), MAX(harga) FROM hpp WHERE {group_where})
+                              WHERE {key_where}""", (*group_params, unit, key))
+
+# ================= IMPORT LEDGER =================
+# import_ledger mencatat apa yang sudah diimpor dari Excel: hash isi per
+# sheet (tingkat 'sheet') dan hash baris ternormalisasi + urutan kemunculan
+# baris identik (tingkat 'baris'). Sheet yang hash-nya tercatat dilewati
+# lewat satu lookup primary key; sheet yang berubah sebagian hanya
+# menerapkan baris yang belum tercatat. Dicatat di transaksi yang sama
+# dengan import-nya. Baris data hasil import menyimpan kunci ledgernya
+# (import_hash, import_urutan), jadi menghapus baris itu juga melupakan
+# entri ledgernya dan file koreksi bisa diimpor ulang.
+
+LEDGER_CHUNK = 500
+# tabel data -> jenis ledger untuk baris yang ditulis import-nya
+LEDGER_TABLES = {'riwayat_stok': 'barang_masuk', 'peminjaman': 'penggunaan', 'hpp': 'hpp'}
+
+def ledger_has_sheet(c, jenis, sheet_hash):
+    return c.execute("""SELECT 1 FROM import_ledger
+                        WHERE jenis = ? AND tingkat = 'sheet' AND hash = ? AND urutan = 0""",
+                     (jenis, sheet_hash)).fetchone() is not None
+
+def ledger_known_rows(c, jenis, hashes):
+    # {(hash, urutan)} yang sudah tercatat untuk hash-hash ini
+    hashes = list(set(hashes))
+    known = set()
+    for i in range(0, len(hashes), LEDGER_CHUNK):
+        chunk = hashes[i:i + LEDGER_CHUNK]
+        known.update(c.execute(f"""SELECT hash, urutan FROM import_ledger
+                                   WHERE jenis = ? AND tingkat = 'baris' AND hash IN ({", ".join("?" * len(chunk))})""",
+                               (jenis, *chunk)).fetchall())
+    return known
+
+def ledger_forget(c, table, where, params=()):
+    # Dipanggil sebelum DELETE FROM table WHERE where. Entri baris milik
+    # baris yang dihapus dibuang; entri sheet jenis itu juga dibuang karena
+    # hanya jalan pintas (sisa baris tetap dilewati lewat entri barisnya).
+    jenis = LEDGER_TABLES[table]
+    removed = c.execute(f"""DELETE FROM import_ledger
+                           WHERE jenis = ? AND tingkat = 'baris' AND (hash, urutan) IN
+                               (SELECT import_hash, import_urutan FROM {table}
+                                WHERE ({where}) AND import_hash IS NOT NULL)""", (jenis, *params)).rowcount
+    if removed:
+        c.execute("DELETE FROM import_ledger WHERE jenis = ? AND tingkat = 'sheet'", (jenis,))
+    return removed
+
+def ledger_record(c, jenis, tingkat, keys, keterangan=None):
+    # keys: iterable (hash, urutan)
+    c.executemany("""INSERT OR IGNORE INTO import_ledger (jenis, tingkat, hash, urutan, keterangan)
+                     VALUES (?, ?, ?, ?, ?)""",
+                  ((jenis, tingkat, h, urutan, keterangan) for h, urutan in keys))
+
+# ================= MIGRATIONS =================
+# Skema database diversikan lewat PRAGMA user_version. Setiap langkah di
+# MIGRATIONS menaikkan versi satu angka dan dijalankan dalam transaksi yang
+# sama dengan update user_version. Langkah harus idempotent (IF NOT EXISTS),
+# karena database lama dari Drive sudah punya tabelnya tapi user_version-nya 0.
+
+def _migration_base_schema(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS barang (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nama_barang TEXT NOT NULL,
+                stok INTEGER NOT NULL,
+                besaran_stok TEXT NOT NULL,
+                gudang TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS peminjaman (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                barang_id INTEGER,
+                nama_barang TEXT NOT NULL,
+                jumlah_pinjam INTEGER NOT NULL,
+                tanggal_pinjam DATE NOT NULL,
+                unit TEXT NOT NULL,
+                besaran_stok TEXT NOT NULL,
+                gudang TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (barang_id) REFERENCES barang (id)
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS riwayat_stok (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                barang_id INTEGER,
+                nama_barang TEXT NOT NULL,
+                jumlah_tambah INTEGER NOT NULL,
+                stok_sebelum INTEGER NOT NULL,
+                stok_sesudah INTEGER NOT NULL,
+                gudang TEXT NOT NULL,
+                tanggal_tambah TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (barang_id) REFERENCES barang (id)
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS hpp (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                unit TEXT NOT NULL,
+                tanggal DATE NOT NULL,
+                material TEXT NOT NULL,
+                harga REAL NOT NULL,
+                keterangan TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+def _migration_indexes(c):
+    # filter tanggal di laporan/riwayat, filter unit HPP, cek stok per barang
+    c.execute("CREATE INDEX IF NOT EXISTS idx_peminjaman_tanggal ON peminjaman (tanggal_pinjam)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_peminjaman_barang ON peminjaman (barang_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_riwayat_stok_tanggal ON riwayat_stok (tanggal_tambah)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hpp_unit_tanggal ON hpp (unit, tanggal)")
+    # lookup import: WHERE LOWER(nama_barang) = LOWER(?) [AND LOWER(gudang) = LOWER(?)]
+    c.execute("CREATE INDEX IF NOT EXISTS idx_barang_nama_gudang_lower ON barang (LOWER(nama_barang), LOWER(gudang))")
+
+def _migration_hpp_iso_dates(c):
+    # import Excel HPP lama menyimpan tanggal sebagai DD/MM/YYYY
+    c.execute("""UPDATE hpp
+                 SET tanggal = substr(tanggal, 7, 4) || '-' || substr(tanggal, 4, 2) || '-' || substr(tanggal, 1, 2)
+                 WHERE tanggal LIKE '__/__/____'""")
+    # sisa format lain (jarang) dikonversi satu per satu
+    rows = c.execute(f"SELECT id, tanggal FROM hpp WHERE tanggal NOT GLOB '{ISO_DATE_GLOB}'").fetchall()
+    updates = []
+    for hpp_id, tanggal in rows:
+        try:
+            updates.append((to_iso_date(tanggal), hpp_id))
+        except ValueError:
+            pass
+    c.executemany("UPDATE hpp SET tanggal = ? WHERE id = ?", updates)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hpp_tanggal ON hpp (tanggal)")
+
+def _migration_usage_rollups(c):
+    for table, period_col, _ in USAGE_ROLLUPS:
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                    {period_col} TEXT NOT NULL,
+                    nama_barang TEXT NOT NULL,
+                    besaran_stok TEXT NOT NULL,
+                    unit TEXT NOT NULL,
+                    jumlah INTEGER NOT NULL,
+                    transaksi INTEGER NOT NULL,
+                    PRIMARY KEY ({period_col}, nama_barang, besaran_stok, unit)
+                    )''')
+        c.execute(f"DELETE FROM {table}")
+    apply_usage_rollup(c, "1")
+
+def _migration_hpp_rollups(c):
+    for table, key_col, _ in HPP_ROLLUPS:
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                    unit TEXT NOT NULL,
+                    {key_col} TEXT NOT NULL,
+                    total REAL NOT NULL,
+                    jumlah INTEGER NOT NULL,
+                    harga_min REAL NOT NULL,
+                    harga_max REAL NOT NULL,
+                    PRIMARY KEY (unit, {key_col})
+                    )''')
+        c.execute(f"DELETE FROM {table}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hpp_unit_material ON hpp (unit, material)")
+    apply_hpp_rollup(c, "1")
+
+def _migration_import_ledger(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS import_ledger (
+                jenis TEXT NOT NULL,
+                tingkat TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                urutan INTEGER NOT NULL DEFAULT 0,
+                keterangan TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (jenis, tingkat, hash, urutan)
+                )''')
+    # kunci ledger di baris data hasil import (NULL untuk input manual)
+    for table in LEDGER_TABLES:
+        columns = [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+        if 'import_hash' not in columns:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN import_hash TEXT")
+            c.execute(f"ALTER TABLE {table} ADD COLUMN import_urutan INTEGER")
+
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_indexes,
+    _migration_hpp_iso_dates,
+    _migration_usage_rollups,
+    _migration_hpp_rollups,
+    _migration_import_ledger,
+]
+
+_migrate_lock = threading.Lock()
+_migrated = {"done": False}
+
+def schema_version():
+    return get_conn().execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    # True jika migrasi baru saja dicek di pemanggilan ini (sekali per proses)
+    with _migrate_lock:
+        if _migrated["done"]:
+            return False
+        current = schema_version()
+        for version, step in enumerate(MIGRATIONS[current:], start=current + 1):
+            with transaction() as c:
+                step(c)
+                c.execute(f"PRAGMA user_version = {version}")
+        if current < len(MIGRATIONS):
+            # statistik baru untuk query planner setelah index ditambah
+            get_conn().execute("PRAGMA optimize")
+            bump_cache_version()
+        _migrated["done"] = True
+        return True
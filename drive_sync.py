@@ -0,0 +1,610 @@
+# ================= SINKRONISASI DATABASE <-> GOOGLE DRIVE =================
+# Modul ini di-import (bukan dijalankan ulang) oleh Streamlit, jadi state di sini
+# bertahan selama proses server hidup dan dipakai bersama oleh semua sesi.
+
+import gzip
+import hashlib
+import io as _io_temp
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import streamlit as st
+
+try:
+    import google_auth_httplib2
+    import httplib2
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload, MediaIoBaseUpload
+except Exception:
+        # Jika lib belum terinstal saat pengembangan lokal, biarkan — Streamlit Cloud akan menginstall dari requirements.
+        pass
+
+
+# Credentials dibuat sekali per proses dan dipakai bersama; token di-refresh
+# otomatis oleh AuthorizedHttp hanya saat kedaluwarsa. Objek httplib2 tidak
+# thread-safe, jadi service + koneksi HTTP (TLS) di-cache per thread — thread
+# uploader yang melakukan hampir semua request memakai satu koneksi terus.
+_drive_lock = threading.Lock()
+_drive_creds = {"sa_json": None, "creds": None}
+_drive_local = threading.local()
+# file_id -> folder Drive tempat file database (dan changeset-nya) berada
+_drive_folders = {}
+
+def _get_drive_credentials():
+    # dipanggil juga dari thread uploader, jadi jangan pakai st.error()/st.stop() di sini
+    sa_json = st.secrets.get("GDRIVE_SERVICE_ACCOUNT", None)
+    if not sa_json:
+        raise RuntimeError("Service account credentials tidak ditemukan di st.secrets['GDRIVE_SERVICE_ACCOUNT']. Tambahkan di Streamlit Cloud → Manage app → Secrets.")
+    with _drive_lock:
+        if _drive_creds["creds"] is None or _drive_creds["sa_json"] != sa_json:
+            try:
+                sa_info = json.loads(sa_json)
+            except Exception as e:
+                raise RuntimeError("Invalid JSON di GDRIVE_SERVICE_ACCOUNT: " + str(e))
+            _drive_creds["creds"] = service_account.Credentials.from_service_account_info(sa_info, scopes=["https://www.googleapis.com/auth/drive"])
+            _drive_creds["sa_json"] = sa_json
+        return _drive_creds["creds"]
+
+def _get_drive_service():
+    creds = _get_drive_credentials()
+    if getattr(_drive_local, "creds", None) is not creds:
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=120))
+        _drive_local.service = build("drive", "v3", http=http, cache_discovery=False)
+        _drive_local.creds = creds
+    return _drive_local.service
+
+GZIP_MAGIC = b"\x1f\x8b"
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+def download_db_from_drive(file_id, local_path):
+    # stream per chunk ke file sementara, lalu ganti file lokal secara atomik
+    dir_name = os.path.dirname(os.path.abspath(local_path))
+    fd, raw_path = tempfile.mkstemp(prefix=".download-", dir=dir_name)
+    os.close(fd)
+    db_path = raw_path
+    try:
+        drive = _get_drive_service()
+        meta = drive.files().get(fileId=file_id, fields="md5Checksum, modifiedTime").execute()
+        request = drive.files().get_media(fileId=file_id)
+        with open(raw_path, "wb") as fh:
+            downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
+        with open(raw_path, "rb") as f:
+            is_gzip = f.read(2) == GZIP_MAGIC
+        if is_gzip:
+            # snapshot terkompresi (lihat upload_db_to_drive); file .db lama tanpa kompresi dipakai apa adanya
+            db_path = raw_path + ".db"
+            with gzip.open(raw_path, "rb") as gz, open(db_path, "wb") as f:
+                shutil.copyfileobj(gz, f, 1024 * 1024)
+        replay_error = None
+        try:
+            applied_seq, replayed = _replay_changesets(drive, file_id, db_path)
+        except Exception as e:
+            applied_seq, replayed, replay_error = None, 0, str(e)
+        _reset_watcher(local_path)
+        # file -wal/-shm milik database lama tidak boleh ikut dibaca oleh file baru
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(local_path + suffix):
+                os.remove(local_path + suffix)
+        os.replace(db_path, local_path)
+        mark_synced(local_path, uploaded_seq=applied_seq, changesets=replayed,
+                    schema_version=_schema_version(local_path),
+                    remote_md5=meta.get("md5Checksum"), remote_modified=meta.get("modifiedTime"))
+        if replay_error:
+            return True, "Downloaded DB from Drive (replay changeset gagal: " + replay_error + ")."
+        if replayed:
+            return True, f"Downloaded DB from Drive (+{replayed} changeset)."
+        return True, "Downloaded DB from Drive."
+    except Exception as e:
+        return False, str(e)
+    finally:
+        for path in (raw_path, db_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def download_if_changed(file_id, local_path):
+    if os.path.exists(local_path):
+        state = _load_state(local_path)
+        if _load_outbox(local_path) is not None or (state and is_dirty(local_path)):
+            # jangan timpa perubahan lokal yang belum ter-upload; uploader akan mengirimnya
+            return True, ""
+    try:
+        drive = _get_drive_service()
+        meta = drive.files().get(fileId=file_id, fields="md5Checksum, modifiedTime").execute()
+    except Exception as e:
+        return False, str(e)
+    if os.path.exists(local_path):
+        if meta.get("md5Checksum"):
+            unchanged = meta["md5Checksum"] == state.get("remote_md5")
+        else:
+            unchanged = meta.get("modifiedTime") == state.get("remote_modified")
+        if unchanged:
+            return True, ""
+    return download_db_from_drive(file_id, local_path)
+
+_startup = {"result": None}
+
+def startup_sync(file_id, local_path):
+    # cukup sekali per proses server, bukan di setiap rerun
+    with _lock:
+        if _startup["result"] is None:
+            _startup["result"] = download_if_changed(file_id, local_path)
+            start_background_sync(local_path)
+        return _startup["result"]
+
+def _snapshot_db(local_path):
+    # Salinan point-in-time yang konsisten lewat SQLite online backup API
+    # (aman walau sesi lain sedang menulis), lalu dikompres dengan gzip.
+    dir_name = os.path.dirname(os.path.abspath(local_path))
+    fd, snap_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".db", dir=dir_name)
+    os.close(fd)
+    gz_path = snap_path + ".gz"
+    base_seq = None
+    try:
+        src = sqlite3.connect(local_path)
+        dst = sqlite3.connect(snap_path)
+        try:
+            src.backup(dst)
+            if _has_changelog(dst):
+                # base menyimpan checkpoint-nya sendiri; log lama tidak perlu ikut dikirim
+                base_seq = _last_seq(dst)
+                dst.execute("DELETE FROM _sync_changelog")
+                dst.execute("INSERT OR REPLACE INTO _sync_meta (key, value) VALUES ('base_seq', ?)", (str(base_seq),))
+                dst.commit()
+        finally:
+            dst.close()
+            src.close()
+        with open(snap_path, "rb") as f_in, gzip.open(gz_path, "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    finally:
+        os.remove(snap_path)
+    return gz_path, base_seq
+
+def upload_db_to_drive(file_id, local_path):
+    gz_path = None
+    try:
+        version = current_version(local_path)
+        schema_version = _schema_version(local_path)
+        gz_path, base_seq = _snapshot_db(local_path)
+        drive = _get_drive_service()
+        media = MediaFileUpload(gz_path, mimetype="application/gzip", resumable=True)
+        updated = drive.files().update(fileId=file_id, media_body=media,
+                                       fields="md5Checksum, modifiedTime").execute()
+        if base_seq is not None:
+            # changeset lama sudah tercakup di base baru
+            if _load_state(local_path).get("changesets"):
+                _delete_changesets(drive, file_id)
+            _prune_changelog(local_path, base_seq)
+        mark_synced(local_path, version=version, uploaded_seq=base_seq, changesets=0,
+                    schema_version=schema_version, remote_md5=updated.get("md5Checksum"),
+                    remote_modified=updated.get("modifiedTime"))
+        return True, "Uploaded DB to Drive."
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if gz_path and os.path.exists(gz_path):
+            os.remove(gz_path)
+
+# ================= DIRTY TRACKING =================
+# Upload hanya perlu dilakukan jika database berubah sejak upload terakhir yang
+# berhasil. Perubahan dideteksi lewat `PRAGMA data_version` pada koneksi pemantau
+# khusus (nilainya berubah setiap kali koneksi lain melakukan commit). Checksum
+# isi file dari upload terakhir disimpan di file sidecar `<db>.sync.json` supaya
+# perubahan yang belum ter-upload sebelum proses restart tetap terdeteksi.
+
+_lock = threading.RLock()
+_watchers = {}
+
+def _state_path(local_path):
+    return local_path + ".sync.json"
+
+def _load_state(local_path):
+    try:
+        with open(_state_path(local_path), "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_state(local_path, state):
+    tmp_path = _state_path(local_path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(local_path))
+
+def _file_md5(path):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _watcher(local_path):
+    key = os.path.abspath(local_path)
+    w = _watchers.get(key)
+    if w is None:
+        conn = sqlite3.connect(local_path, check_same_thread=False)
+        w = {"conn": conn, "synced_version": None}
+        _watchers[key] = w
+    return w
+
+def _reset_watcher(local_path):
+    with _lock:
+        w = _watchers.pop(os.path.abspath(local_path), None)
+        if w is not None:
+            w["conn"].close()
+
+def current_version(local_path):
+    with _lock:
+        w = _watcher(local_path)
+        return w["conn"].execute("PRAGMA data_version").fetchone()[0]
+
+def is_dirty(local_path):
+    if not os.path.exists(local_path):
+        return False
+    with _lock:
+        w = _watcher(local_path)
+        version = current_version(local_path)
+        if w["synced_version"] is None:
+            # pertama kali dicek di proses ini: bandingkan dengan upload terakhir
+            if not _matches_last_upload(local_path, w["conn"]):
+                return True
+            w["synced_version"] = version
+        return version != w["synced_version"]
+
+def _matches_last_upload(local_path, conn):
+    state = _load_state(local_path)
+    if state.get("uploaded_seq") is not None and _has_changelog(conn):
+        # checkpoint changelog tidak terpengaruh checkpoint WAL ke file utama
+        return _last_seq(conn) == state["uploaded_seq"]
+    wal_path = local_path + "-wal"
+    if os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+        return False
+    return state.get("md5") == _file_md5(local_path)
+
+def mark_synced(local_path, version=None, md5=None, **state_updates):
+    # Titik sync disimpan sebagai uploaded_seq (mode incremental) atau md5
+    # file. md5 tidak dihitung bila ada uploaded_seq: upload changeset kecil
+    # tidak perlu membaca seluruh file database.
+    with _lock:
+        state = _load_state(local_path)
+        state.update(state_updates)
+        if md5 is not None:
+            state["md5"] = md5
+        elif state.get("uploaded_seq") is None:
+            state["md5"] = _file_md5(local_path)
+        else:
+            state.pop("md5", None)
+        _save_state(local_path, state)
+        w = _watcher(local_path)
+        w["synced_version"] = version if version is not None else current_version(local_path)
+
+# ================= INCREMENTAL CHANGESET SYNC =================
+# Trigger mencatat setiap perubahan baris pada tabel yang disinkronkan ke
+# tabel _sync_changelog. Sync biasa hanya mengirim baris yang berubah sejak
+# checkpoint terakhir sebagai file changeset kecil di folder Drive yang sama
+# dengan file database. Snapshot penuh (base) tetap dikirim berkala, saat
+# skema berubah, atau jika changeset gagal dibuat. Saat download, base lalu
+# changeset sesudahnya di-replay berurutan.
+
+MAX_CHANGESETS = 50
+MAX_CHANGESET_ROWS = 5000
+CHANGESET_PATTERN = re.compile(r"\.changeset\.(\d+)-(\d+)\.json\.gz$")
+
+def _trigger_sql(table, columns, event):
+    name = f"_sync_{table}_{event.lower()}"
+    if event == "DELETE":
+        values = f"'{table}', 'delete', OLD.rowid, NULL"
+    else:
+        pairs = ", ".join(f"'{col}', NEW.\"{col}\"" for col in columns)
+        values = f"'{table}', 'upsert', NEW.rowid, json_object({pairs})"
+    sql = (f"CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN "
+           f"INSERT INTO _sync_changelog (tbl, op, row_id, data) VALUES ({values}); END")
+    return name, sql
+
+def install_change_tracking(conn, tables):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS _sync_changelog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tbl TEXT NOT NULL,
+                op TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                data TEXT
+                )''')
+    c.execute("CREATE TABLE IF NOT EXISTS _sync_meta (key TEXT PRIMARY KEY, value TEXT)")
+    existing = dict(c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall())
+    for table in tables:
+        columns = [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            name, sql = _trigger_sql(table, columns, event)
+            # trigger dibuat ulang hanya jika kolom tabel berubah
+            if existing.get(name) != sql:
+                c.execute(f"DROP TRIGGER IF EXISTS {name}")
+                c.execute(sql)
+    conn.commit()
+
+def remove_change_tracking(conn):
+    # Tanpa sync incremental tidak ada upload yang memangkas _sync_changelog,
+    # jadi trigger dan tabel log dibuang. Tanpa tabel log, dirty check kembali
+    # memakai md5 file; drop juga mengubah schema_version, sehingga upload
+    # pertama setelah tracking dipasang lagi selalu berupa base penuh.
+    c = conn.cursor()
+    names = [row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '\\_sync\\_%' ESCAPE '\\'")]
+    for name in names:
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+    c.execute("DROP TABLE IF EXISTS _sync_changelog")
+    conn.commit()
+
+def incremental_enabled(file_id):
+    return bool(file_id) and _sync_mode() == "incremental"
+
+def _has_changelog(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_sync_changelog'").fetchone() is not None
+
+def _last_seq(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = '_sync_changelog'").fetchone()
+    return row[0] if row else 0
+
+def _schema_version(local_path):
+    with _lock:
+        return _watcher(local_path)["conn"].execute("PRAGMA schema_version").fetchone()[0]
+
+def _prune_changelog(local_path, upto_seq):
+    # ditulis lewat koneksi pemantau sendiri, jadi tidak dianggap perubahan data (data_version tetap)
+    with _lock:
+        conn = _watcher(local_path)["conn"]
+        conn.execute("DELETE FROM _sync_changelog WHERE seq <= ?", (upto_seq,))
+        conn.commit()
+
+def _sync_mode():
+    return st.secrets.get("DRIVE_SYNC_MODE", "incremental")
+
+def _changeset_name(file_id, first_seq, last_seq):
+    return f"{file_id}.changeset.{first_seq:012d}-{last_seq:012d}.json.gz"
+
+def _drive_folder_id(drive, file_id):
+    # folder file database tidak berubah: cukup sekali ditanyakan per proses
+    with _drive_lock:
+        folder_id = _drive_folders.get(file_id)
+    if folder_id is None:
+        folder_id = drive.files().get(fileId=file_id, fields="parents").execute()["parents"][0]
+        with _drive_lock:
+            _drive_folders[file_id] = folder_id
+    return folder_id
+
+def _list_changesets(drive, file_id):
+    folder_id = _drive_folder_id(drive, file_id)
+    query = f"'{folder_id}' in parents and name contains '{file_id}.changeset' and trashed = false"
+    changesets = []
+    page_token = None
+    while True:
+        resp = drive.files().list(q=query, fields="nextPageToken, files(id, name)",
+                                  pageSize=1000, pageToken=page_token).execute()
+        for item in resp.get("files", []):
+            match = CHANGESET_PATTERN.search(item["name"])
+            if match:
+                changesets.append((int(match.group(1)), int(match.group(2)), item["id"]))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            break
+    return sorted(changesets)
+
+def _delete_changesets(drive, file_id):
+    try:
+        for first_seq, last_seq, changeset_id in _list_changesets(drive, file_id):
+            drive.files().delete(fileId=changeset_id).execute()
+    except Exception:
+        # changeset yang tertinggal aman: saat replay dilewati karena <= base_seq
+        pass
+
+def _use_changeset(local_path):
+    if _sync_mode() != "incremental":
+        return False
+    with _lock:
+        conn = _watcher(local_path)["conn"]
+        state = _load_state(local_path)
+        if not _has_changelog(conn) or state.get("uploaded_seq") is None:
+            return False
+        if state.get("schema_version") != _schema_version(local_path):
+            return False
+        if state.get("changesets", 0) >= MAX_CHANGESETS:
+            return False
+        pending = conn.execute("SELECT COUNT(*) FROM _sync_changelog WHERE seq > ?",
+                               (state["uploaded_seq"],)).fetchone()[0]
+        return pending <= MAX_CHANGESET_ROWS
+
+def upload_changeset_to_drive(file_id, local_path):
+    try:
+        with _lock:
+            version = current_version(local_path)
+            state = _load_state(local_path)
+            rows = _watcher(local_path)["conn"].execute(
+                "SELECT seq, tbl, op, row_id, data FROM _sync_changelog WHERE seq > ? ORDER BY seq",
+                (state["uploaded_seq"],)).fetchall()
+        if not rows:
+            mark_synced(local_path, version=version)
+            return True, "Tidak ada perubahan baris untuk di-upload."
+        first_seq, last_seq = rows[0][0], rows[-1][0]
+        lines = [json.dumps({"seq": seq, "tbl": tbl, "op": op, "row_id": row_id,
+                             "data": json.loads(data) if data else None})
+                 for seq, tbl, op, row_id, data in rows]
+        payload = gzip.compress("\n".join(lines).encode("utf-8"))
+        drive = _get_drive_service()
+        media = MediaIoBaseUpload(_io_temp.BytesIO(payload), mimetype="application/gzip", resumable=False)
+        drive.files().create(body={"name": _changeset_name(file_id, first_seq, last_seq),
+                                   "parents": [_drive_folder_id(drive, file_id)]},
+                             media_body=media, fields="id").execute()
+        _prune_changelog(local_path, last_seq)
+        mark_synced(local_path, version=version, uploaded_seq=last_seq,
+                    changesets=state.get("changesets", 0) + 1)
+        return True, f"Uploaded changeset ({len(rows)} perubahan) to Drive."
+    except Exception as e:
+        return False, str(e)
+
+def sync_to_drive(file_id, local_path):
+    if _use_changeset(local_path):
+        ok, msg = upload_changeset_to_drive(file_id, local_path)
+        if ok:
+            return ok, msg
+        # changeset gagal dibuat (mis. kuota Drive service account): kirim base penuh
+    return upload_db_to_drive(file_id, local_path)
+
+def _apply_changes(conn, entries):
+    columns = {}
+    for entry in entries:
+        table = entry["tbl"]
+        if table not in columns:
+            columns[table] = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not columns[table]:
+            continue
+        if entry["op"] == "delete":
+            conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (entry["row_id"],))
+        else:
+            data = {k: v for k, v in entry["data"].items() if k in columns[table]}
+            col_sql = "".join(f', "{k}"' for k in data)
+            marks = "".join(", ?" for _ in data)
+            conn.execute(f"INSERT OR REPLACE INTO {table} (rowid{col_sql}) VALUES (?{marks})",
+                         (entry["row_id"], *data.values()))
+
+def _replay_changesets(drive, file_id, local_path):
+    conn = sqlite3.connect(local_path)
+    try:
+        if not _has_changelog(conn):
+            return None, 0
+        row = conn.execute("SELECT value FROM _sync_meta WHERE key = 'base_seq'").fetchone()
+        applied_seq = int(row[0]) if row else _last_seq(conn)
+        local_seq = _last_seq(conn)
+        replayed = 0
+        for first_seq, last_seq, changeset_id in _list_changesets(drive, file_id):
+            if last_seq <= applied_seq:
+                continue
+            if first_seq > applied_seq + 1:
+                # ada changeset yang hilang; berhenti di titik konsisten terakhir
+                break
+            payload = gzip.decompress(drive.files().get_media(fileId=changeset_id).execute())
+            entries = [json.loads(line) for line in payload.decode("utf-8").splitlines() if line]
+            _apply_changes(conn, [e for e in entries if e["seq"] > applied_seq])
+            applied_seq = last_seq
+            replayed += 1
+        # trigger ikut mencatat baris hasil replay; buang, lalu lanjutkan nomor seq dari checkpoint
+        conn.execute("DELETE FROM _sync_changelog WHERE seq > ?", (local_seq,))
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = '_sync_changelog'",
+                     (max(applied_seq, local_seq),))
+        conn.commit()
+        return applied_seq, replayed
+    finally:
+        conn.close()
+
+# ================= BACKGROUND UPLOADER =================
+# Fungsi tulis cukup memanggil notify_dirty() lalu langsung kembali ke UI.
+# Thread uploader menggabungkan rentetan penulisan menjadi satu upload
+# (debounce), dan upload yang gagal dicatat di file outbox `<db>.outbox.json`
+# lalu dicoba ulang dengan exponential backoff — juga setelah proses restart.
+
+DEBOUNCE_SECONDS = 3
+MAX_DEBOUNCE_SECONDS = 30
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 600
+
+_wake = threading.Event()
+_worker = {"thread": None, "last_upload": None}
+
+def _outbox_path(local_path):
+    return local_path + ".outbox.json"
+
+def _load_outbox(local_path):
+    try:
+        with open(_outbox_path(local_path), "r") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _save_outbox(local_path, outbox):
+    tmp_path = _outbox_path(local_path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(outbox, f)
+    os.replace(tmp_path, _outbox_path(local_path))
+
+def _clear_outbox(local_path):
+    try:
+        os.remove(_outbox_path(local_path))
+    except FileNotFoundError:
+        pass
+
+def notify_dirty(file_id, local_path):
+    with _lock:
+        if _load_outbox(local_path) is None:
+            _save_outbox(local_path, {"file_id": file_id, "attempts": 0, "next_attempt": 0,
+                                      "queued_at": time.time(), "last_error": None})
+    start_background_sync(local_path)
+    _wake.set()
+
+def start_background_sync(local_path):
+    # aman dipanggil di setiap rerun; thread hanya dibuat sekali per proses
+    with _lock:
+        thread = _worker["thread"]
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_worker_loop, args=(local_path,),
+                                      name="drive-sync-uploader", daemon=True)
+            _worker["thread"] = thread
+            thread.start()
+    if _load_outbox(local_path) is not None:
+        _wake.set()
+
+def _worker_loop(local_path):
+    while True:
+        _wake.wait()
+        _wake.clear()
+        outbox = _load_outbox(local_path)
+        if outbox is None:
+            continue
+
+        # debounce: tunggu sampai tidak ada penulisan baru selama DEBOUNCE_SECONDS
+        started = time.time()
+        while _wake.wait(DEBOUNCE_SECONDS) and time.time() - started < MAX_DEBOUNCE_SECONDS:
+            _wake.clear()
+        _wake.clear()
+
+        delay = outbox.get("next_attempt", 0) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            ok, msg = sync_to_drive(outbox["file_id"], local_path) if is_dirty(local_path) else (True, "")
+        except Exception as e:
+            ok, msg = False, str(e)
+
+        with _lock:
+            if ok:
+                _worker["last_upload"] = time.time()
+                if is_dirty(local_path):
+                    # ada penulisan baru selama upload berjalan: jadwalkan upload berikutnya
+                    outbox.update({"attempts": 0, "next_attempt": 0, "last_error": None})
+                    _save_outbox(local_path, outbox)
+                    _wake.set()
+                else:
+                    _clear_outbox(local_path)
+            else:
+                attempts = outbox.get("attempts", 0) + 1
+                backoff = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+                outbox.update({"attempts": attempts, "next_attempt": time.time() + backoff, "last_error": msg})
+                _save_outbox(local_path, outbox)
+                _wake.set()
+
+def sync_status(local_path):
+    outbox = _load_outbox(local_path)
+    return {
+        "pending": outbox is not None,
+        "attempts": outbox.get("attempts", 0) if outbox else 0,
+        "next_attempt": outbox.get("next_attempt", 0) if outbox else 0,
+        "last_error": outbox.get("last_error") if outbox else None,
+        "last_upload": _worker["last_upload"],
+    }
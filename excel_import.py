@@ -0,0 +1,284 @@
+import hashlib
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from itertools import islice, repeat
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Parsing workbook import dalam bentuk operasi per kolom (bukan per baris),
+# supaya file supplier puluhan ribu baris tetap cepat. Modul ini sengaja
+# tidak bergantung pada streamlit/db: pemanggil yang menampilkan hasil dan
+# menulis ke database.
+
+# ================= PENGELUARAN MATERIAL (HPP) =================
+
+HPP_HEADER_WORDS = ['material', 'tanggal', 'keterangan', 'no', 'item']
+HPP_SUMMARY_PATTERN = r'^(jumlah|total|subtotal|grand total|catatan|summary)'
+HPP_HARGA_MAX = 100_000_000
+
+def _cell_text(col):
+    # setara str(x).strip() per sel; sel kosong (NaN/None) menjadi 'nan'
+    return col.astype(object).where(col.notna(), 'nan').astype(str).str.strip()
+
+def parse_pengeluaran_material(df_raw):
+    # df_raw: sheet dibaca dengan header=None; kolom 1 tanggal, 2 material,
+    # 3 unit, 5 harga. Mengembalikan (DataFrame Tanggal/Material/Unit/Harga,
+    # daftar alasan baris yang dilewati).
+    df_raw = df_raw.reindex(columns=range(6))
+    tanggal_raw, material_raw, unit_raw, harga_raw = df_raw[1], df_raw[2], df_raw[3], df_raw[5]
+
+    material_text = _cell_text(material_raw)
+    material_str = material_text.str.lower()
+    harga_str = _cell_text(harga_raw)
+
+    kosong = material_str.isin(['nan', 'none', ''])
+    header = ~kosong & material_str.isin(HPP_HEADER_WORDS)
+    summary = ~kosong & ~header & material_str.str.match(HPP_SUMMARY_PATTERN)
+    tanpa_harga = ~kosong & ~header & ~summary & harga_str.str.lower().isin(['nan', 'none', ''])
+    cek_harga = ~(kosong | header | summary | tanpa_harga)
+
+    harga = pd.to_numeric(harga_str.str.replace(r'[^\d.-]', '', regex=True).where(cek_harga),
+                          errors='coerce').astype(float)
+    invalid = cek_harga & harga.isna()
+    ekstrem = cek_harga & ~invalid & ((harga <= 0) | (harga > HPP_HARGA_MAX))
+    valid = cek_harga & ~invalid & ~ekstrem
+
+    alasan = pd.Series(pd.NA, index=df_raw.index, dtype=object)
+    alasan[header] = "Header row"
+    alasan[summary] = "Summary row - '" + material_str[summary].str[:50] + "'"
+    alasan[ekstrem] = "Harga ekstrem - " + harga[ekstrem].map('{:,.0f}'.format).astype(str)
+    alasan[invalid] = "Invalid harga '" + harga_raw[invalid].astype(str) + "'"
+    alasan = alasan.dropna()
+    skipped_rows = [f"Row {idx}: {text}" for idx, text in alasan.items()]
+
+    tanggal = tanggal_raw[valid]
+    ada_tanggal = tanggal.notna() & (_cell_text(tanggal) != '')
+    tanggal = pd.to_datetime(tanggal.where(ada_tanggal), format='mixed', errors='coerce')
+
+    df = pd.DataFrame({
+        "Tanggal": tanggal,
+        "Material": material_text[valid],
+        "Unit": _cell_text(unit_raw[valid]).where(unit_raw[valid].notna(), ""),
+        "Harga": harga[valid],
+    }).reset_index(drop=True)
+    return df, skipped_rows
+
+# ================= SHEET MINGGUAN (BARANG MASUK / PENGGUNAAN) =================
+
+HARI_COLS = ['sen', 'sel', 'rab', 'kam', 'jum', 'sab', 'min']
+
+def _used_width(df):
+    # lebar baris header seperti pd.read_excel(header=..., nrows=0)
+    used = df.notna().any().to_numpy().nonzero()[0]
+    return int(used[-1]) + 1 if len(used) else 0
+
+def weekly_sheet(raw, day_row):
+    # Sheet mingguan: kolom B nama barang, D satuan, dan baris day_row (0-based)
+    # berisi SEN..MIN; data mulai baris sesudahnya. Nama kolom sama dengan
+    # header gabungan lama (skip_a, namabarang, skip_jumlah, satuan, sen.., skip_i).
+    header_width = _used_width(raw.iloc[:day_row + 1])
+    fixed = ['skip_a', 'namabarang', 'skip_jumlah', 'satuan']
+    header = []
+    seen = set()
+    for i in range(header_width):
+        value = raw.iat[day_row, i] if day_row < len(raw) else None
+        # sel kosong / nama duplikat di-rename pandas ('Unnamed: i', 'SEN.1'), jadi bukan nama hari
+        clean = ''
+        if pd.notna(value):
+            if value not in seen:
+                clean = str(value).lower().strip().replace(' ', '')
+            seen.add(value)
+        if i < len(fixed):
+            header.append(fixed[i])
+        else:
+            header.append(clean if clean in HARI_COLS else 'skip_' + str(i))
+
+    data = raw.iloc[day_row + 1:].reset_index(drop=True).infer_objects()
+    # teks angka ('3') dikonversi per kolom seperti saat pandas membaca data tanpa baris header
+    for col in data.select_dtypes(include=['object', 'string']).columns:
+        try:
+            data[col] = pd.to_numeric(data[col])
+        except (ValueError, TypeError):
+            pass
+    num_data_cols = len(data.columns)
+    if len(header) >= num_data_cols:
+        data.columns = header[:num_data_cols]
+    else:
+        data.columns = header + [f'extra_{j}' for j in range(len(header), num_data_cols)]
+    return data
+
+def _to_jumlah(col):
+    # setara int(float(x)) per sel; kosong atau tidak valid menjadi 0
+    if not pd.api.types.is_numeric_dtype(col):
+        col = pd.to_numeric(_cell_text(col), errors='coerce')
+    col = col.astype(float)
+    return np.trunc(col.where(np.isfinite(col), 0)).astype('int64')
+
+def weekly_cells(df):
+    # Unpivot sheet mingguan (hasil weekly_sheet) menjadi satu baris per sel
+    # hari dengan jumlah > 0, urut per baris lalu SEN..MIN seperti urutan
+    # import lama. Kolom: nama_barang, satuan, jumlah, hari (0 = SEN).
+    columns = list(df.columns)
+    # kolom hari yang muncul ganda tidak pernah terbaca oleh import lama
+    hari_ada = [h for h in HARI_COLS if columns.count(h) == 1]
+    if 'namabarang' not in columns or not hari_ada:
+        return pd.DataFrame({'nama_barang': pd.Series(dtype=object), 'satuan': pd.Series(dtype=object),
+                             'jumlah': pd.Series(dtype='int64'), 'hari': pd.Series(dtype='int64')})
+
+    nama = _cell_text(df['namabarang'])
+    satuan = _cell_text(df['satuan']) if 'satuan' in columns else pd.Series('', index=df.index)
+    satuan = satuan.where(~satuan.isin(['', 'nan']), 'pcs')
+
+    jumlah = pd.DataFrame({h: _to_jumlah(df[h]) for h in hari_ada}, index=df.index)
+    jumlah = jumlah[~nama.isin(['', 'nan'])].stack()
+    jumlah = jumlah[jumlah > 0]
+
+    rows = jumlah.index.get_level_values(0)
+    hari = jumlah.index.get_level_values(1)
+    return pd.DataFrame({
+        'nama_barang': nama.loc[rows].to_numpy(),
+        'satuan': satuan.loc[rows].to_numpy(),
+        'jumlah': jumlah.to_numpy(),
+        'hari': hari.map(HARI_COLS.index).to_numpy(dtype='int64'),
+    })
+
+def weekly_events(cells, tanggal_senin):
+    # hasil weekly_cells + tanggal minggu yang dipilih user.
+    # Kolom: nama_barang, satuan, jumlah, tanggal (YYYY-MM-DD).
+    tanggal_hari = np.array([(tanggal_senin + timedelta(days=i)).isoformat() for i in range(len(HARI_COLS))],
+                            dtype=object)
+    return cells.assign(tanggal=tanggal_hari[cells['hari'].to_numpy()]).drop(columns='hari')
+
+# ================= PARSING PARALEL PER SHEET =================
+
+# Menyalakan worker (spawn + import pandas) makan ~2 detik; workbook kecil
+# lebih cepat diparse di proses ini saja.
+PARALLEL_MIN_BYTES = 1_000_000
+
+def _weekly_parts(raw, day_row):
+    frame = weekly_sheet(raw, day_row)
+    return frame, weekly_cells(frame)
+
+# bytes workbook di proses worker, diisi sekali oleh _init_worker saat
+# worker start, jadi tidak ikut di-pickle untuk setiap sheet
+_worker_data = None
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+def parse_weekly_sheet(sheet_name, day_row):
+    # Worker: baca satu sheet dari workbook milik worker, gabungkan header dan
+    # unpivot SEN..MIN. Harus tetap fungsi level modul agar bisa di-pickle.
+    return _weekly_parts(pd.read_excel(BytesIO(_worker_data), sheet_name=sheet_name, header=None), day_row)
+
+def parse_weekly_workbook(data, day_row, max_workers=None):
+    # Mengembalikan ({sheet: frame}, {sheet: cells}) dengan urutan sheet
+    # seperti di workbook. Workbook besar diparse per sheet di process pool
+    # seukuran jumlah core (context spawn: aman dari thread script streamlit).
+    with pd.ExcelFile(BytesIO(data)) as xls:
+        names = xls.sheet_names
+        workers = min(len(names), max_workers or os.cpu_count() or 1)
+        paralel = workers >= 2 and len(data) >= PARALLEL_MIN_BYTES
+        if not paralel:
+            sheets = pd.read_excel(xls, sheet_name=None, header=None)
+            results = [_weekly_parts(sheets[name], day_row) for name in names]
+    if paralel:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(data,)) as pool:
+            results = list(pool.map(parse_weekly_sheet, names, repeat(day_row)))
+    frames = {name: frame for name, (frame, _) in zip(names, results)}
+    cells = {name: cell for name, (_, cell) in zip(names, results)}
+    return frames, cells
+
+# ================= PEMBACAAN STREAMING (XLSX BESAR) =================
+# Mode streaming membaca baris lewat iterator read-only openpyxl dan
+# menerapkan aturan parsing yang sama per STREAM_CHUNK_ROWS baris, jadi
+# memori puncak sebatas satu chunk, bukan satu sheet penuh. Hanya xlsx.
+
+STREAM_CHUNK_ROWS = 5000
+
+def _stream_cell(value):
+    # sama dengan pembaca openpyxl di pandas: sel kosong NaN, angka bulat int
+    if value is None:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def stream_sheet_names(source):
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+def iter_sheet_chunks(source, sheet_name, chunk_rows=STREAM_CHUNK_ROWS, max_col=None):
+    # DataFrame per chunk tanpa header; index = nomor baris sheet 0-based,
+    # sama dengan pd.read_excel(header=None)
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(max_col=max_col, values_only=True)
+        start = 0
+        while True:
+            block = [tuple(map(_stream_cell, row)) for row in islice(rows, chunk_rows)]
+            if not block:
+                break
+            yield pd.DataFrame(block, index=range(start, start + len(block)))
+            start += len(block)
+    finally:
+        wb.close()
+
+def _first_chunk(source, sheet_name, rows, max_col=None):
+    chunks = iter_sheet_chunks(source, sheet_name, rows, max_col)
+    try:
+        return next(chunks, pd.DataFrame())
+    finally:
+        chunks.close()
+
+def stream_pengeluaran_material(source, sheet_name, chunk_rows=STREAM_CHUNK_ROWS):
+    # parse_pengeluaran_material per chunk kolom A..F; yield (df, skipped_rows)
+    # dengan nomor baris sheet yang sama seperti mode biasa
+    for chunk in iter_sheet_chunks(source, sheet_name, chunk_rows, max_col=6):
+        yield parse_pengeluaran_material(chunk)
+
+def preview_pengeluaran_material(source, sheet_name, rows=200):
+    return parse_pengeluaran_material(_first_chunk(source, sheet_name, rows, max_col=6))[0]
+
+def stream_weekly_cells(source, sheet_name, day_row, chunk_rows=STREAM_CHUNK_ROWS):
+    # weekly_cells per chunk; baris header (0..day_row) disertakan di setiap
+    # chunk supaya weekly_sheet memberi nama kolom yang sama. Header dikumpulkan
+    # dulu sampai lengkap karena bisa terbagi di beberapa chunk kecil.
+    header = pd.DataFrame()
+    for chunk in iter_sheet_chunks(source, sheet_name, chunk_rows):
+        kurang = day_row + 1 - len(header)
+        if kurang > 0:
+            header = pd.concat([header, chunk.iloc[:kurang]])
+            chunk = chunk.iloc[kurang:]
+        if not chunk.empty:
+            yield weekly_cells(weekly_sheet(pd.concat([header, chunk]), day_row))
+
+def preview_weekly_sheet(source, sheet_name, day_row, rows=5):
+    return weekly_sheet(_first_chunk(source, sheet_name, day_row + 1 + rows), day_row)
+
+# ================= HASH UNTUK IMPORT LEDGER =================
+
+def row_hashes(df, columns):
+    # sha1 per baris dari kolom-kolom kunci (teks lower/strip), sengaja tidak
+    # memakai hash_pandas_object supaya nilai yang tersimpan stabil lintas versi
+    text = [_cell_text(df[col]).str.lower() for col in columns]
+    joined = text[0].str.cat(text[1:], sep='\x1f')
+    return pd.Series([hashlib.sha1(t.encode()).hexdigest() for t in joined], index=df.index, dtype=object)
+
+def sheet_hash(hashes):
+    return hashlib.sha256('\n'.join(hashes).encode()).hexdigest()
+
+def sheet_hash_update(hasher, hashes, lanjutan):
+    # sheet_hash bertahap untuk mode streaming: hasher sha256 diisi per chunk,
+    # lanjutan=True mulai chunk kedua; hexdigest() akhirnya sama dengan sheet_hash()
+    hasher.update((('\n' if lanjutan else '') + '\n'.join(hashes)).encode())
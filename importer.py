@@ -0,0 +1,254 @@
+# ================= IMPORT EXCEL KE DATABASE =================
+# Jalur tulis import Excel: baris ternormalisasi (hasil excel_import) diubah
+# menjadi penulisan set-based ke database, disaring import_ledger supaya
+# upload ulang tidak menggandakan data. Tidak memakai elemen UI, jadi
+# dipakai dari thread job import (lihat jobs.py) dan bisa diuji tanpa
+# menjalankan app.py. Semua fungsi tulis menerima cursor transaksi pemanggil.
+
+import hashlib
+import string
+
+import numpy as np
+import pandas as pd
+
+import db
+import excel_import
+
+# ================= BARANG MASUK & PENGGUNAAN =================
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+def _sql_lower(col):
+    # LOWER() SQLite hanya mengubah huruf ASCII
+    return col.astype(str).str.translate(_ASCII_LOWER)
+
+def _barang_index(c, kunci_gudang):
+    # nama -> (id, stok) per gudang (kunci LOWER), dimuat sekali; nama ganda ->
+    # id terkecil (sama dengan hasil pertama lookup LOWER(nama)/LOWER(gudang) lama)
+    rows = []
+    for gudang in kunci_gudang:
+        rows += c.execute("""SELECT LOWER(gudang), LOWER(nama_barang), MIN(id), stok FROM barang
+                             WHERE LOWER(gudang) = ? GROUP BY LOWER(nama_barang)""", (gudang,)).fetchall()
+    return pd.DataFrame(rows, columns=['kunci_gudang', 'kunci_nama', 'barang_id', 'stok_awal'])
+
+def _import_keys(events):
+    # kolom (import_hash, import_urutan) baris hasil new_import_rows /
+    # stream_import_sheet; None bila events tidak lewat ledger
+    if 'import_hash' not in events:
+        return [None] * len(events), [None] * len(events)
+    return events['import_hash'].tolist(), events['import_urutan'].astype('int64').tolist()
+
+def import_barang_masuk(c, events):
+    # events: nama_barang, satuan, jumlah, tanggal, gudang dalam urutan sheet/baris/hari.
+    # Hasilnya sama dengan memproses sel satu per satu (barang baru dibuat pada
+    # kemunculan pertama, berikutnya menambah stok), tapi stok berjalan dihitung
+    # di memori dan semua baris ditulis dengan executemany.
+    # Mengembalikan (jumlah barang baru, jumlah penambahan stok).
+    if events.empty:
+        return 0, 0
+    keys = ['kunci_gudang', 'kunci_nama']
+    events = events.assign(kunci_gudang=_sql_lower(events['gudang']), kunci_nama=_sql_lower(events['nama_barang']))
+    events = events.merge(_barang_index(c, events['kunci_gudang'].unique()), on=keys, how='left')
+
+    baru = events['barang_id'].isna()
+    grup = events.groupby(keys, sort=False)
+    events['stok_sesudah'] = events['stok_awal'].fillna(0).astype('int64') + grup['jumlah'].cumsum()
+    events['stok_sebelum'] = events['stok_sesudah'] - events['jumlah']
+    akhir = events.drop_duplicates(keys, keep='last').set_index(keys)
+
+    # barang baru: nama/tanggal dari kemunculan pertama, stok & satuan dari yang terakhir
+    pertama = events[baru].drop_duplicates(keys)
+    if not pertama.empty:
+        akhir_baru = akhir.loc[pd.MultiIndex.from_frame(pertama[keys])]
+        last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM barang").fetchone()[0]
+        c.executemany("INSERT INTO barang (nama_barang, stok, besaran_stok, gudang, created_at) VALUES (?, ?, ?, ?, ?)",
+                      zip(pertama['nama_barang'].tolist(), akhir_baru['stok_sesudah'].tolist(),
+                          akhir_baru['satuan'].tolist(), pertama['gudang'].tolist(), pertama['tanggal'].tolist()))
+        new_ids = [row[0] for row in c.execute("SELECT id FROM barang WHERE id > ? ORDER BY id", (last_id,))]
+        id_baru = pd.Series(new_ids, index=pd.MultiIndex.from_frame(pertama[keys]))
+        events.loc[baru, 'barang_id'] = id_baru.loc[pd.MultiIndex.from_frame(events.loc[baru, keys])].to_numpy()
+
+    lama = akhir[akhir['stok_awal'].notna()]
+    c.executemany("UPDATE barang SET stok = ?, besaran_stok = ? WHERE id = ?",
+                  zip(lama['stok_sesudah'].tolist(), lama['satuan'].tolist(), lama['barang_id'].astype('int64').tolist()))
+
+    c.executemany("""INSERT INTO riwayat_stok
+                  (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah,
+                   import_hash, import_urutan)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                  zip(events['barang_id'].astype('int64').tolist(), events['nama_barang'].tolist(),
+                      events['jumlah'].tolist(), events['stok_sebelum'].tolist(), events['stok_sesudah'].tolist(),
+                      events['gudang'].tolist(), events['tanggal'].tolist(), *_import_keys(events)))
+    return len(pertama), len(events) - len(pertama)
+
+def _barang_by_nama(c):
+    # nama -> barang pertama di urutan idx_barang_nama_gudang_lower (LOWER(gudang), id),
+    # sama dengan fetchone() lookup LOWER(nama_barang) lama, lintas gudang
+    rows = c.execute("""SELECT LOWER(nama_barang), id, stok, gudang FROM barang
+                        ORDER BY LOWER(nama_barang), LOWER(gudang), id""").fetchall()
+    index = pd.DataFrame(rows, columns=['kunci_nama', 'barang_id', 'stok_awal', 'gudang'])
+    return index.drop_duplicates('kunci_nama')
+
+def import_penggunaan(c, events):
+    # events: nama_barang, satuan, jumlah, tanggal, unit dalam urutan sheet/baris/hari.
+    # Setiap sel tetap menjadi satu baris peminjaman (barang_id NULL, Gudang 1);
+    # stok barang yang namanya cocok dikurangi dengan stok berjalan yang
+    # di-clamp di 0, dihitung di memori lalu ditulis dengan executemany.
+    # Mengembalikan jumlah transaksi.
+    if events.empty:
+        return 0
+    c.executemany("""INSERT INTO peminjaman
+                  (barang_id, nama_barang, jumlah_pinjam, tanggal_pinjam, unit, besaran_stok, gudang,
+                   import_hash, import_urutan)
+                  VALUES (NULL, ?, ?, ?, ?, ?, 'Gudang 1', ?, ?)""",
+                  zip(events['nama_barang'].tolist(), events['jumlah'].tolist(), events['tanggal'].tolist(),
+                      events['unit'].tolist(), events['satuan'].tolist(), *_import_keys(events)))
+
+    keluar = events.assign(kunci_nama=_sql_lower(events['nama_barang'])).merge(_barang_by_nama(c), on='kunci_nama')
+    if not keluar.empty:
+        # max(stok - a, 0) berturut-turut == max(stok - (a + b + ...), 0)
+        terpakai = keluar.groupby('barang_id', sort=False)['jumlah'].cumsum()
+        keluar['stok_sesudah'] = (keluar['stok_awal'] - terpakai).clip(lower=0)
+        keluar['stok_sebelum'] = (keluar.groupby('barang_id', sort=False)['stok_sesudah'].shift()
+                                  .fillna(keluar['stok_awal']).astype('int64'))
+
+        akhir = keluar.drop_duplicates('barang_id', keep='last')
+        c.executemany("UPDATE barang SET stok = ? WHERE id = ?",
+                      zip(akhir['stok_sesudah'].tolist(), akhir['barang_id'].tolist()))
+        c.executemany("""INSERT INTO riwayat_stok
+                      (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                      zip(keluar['barang_id'].tolist(), keluar['nama_barang'].tolist(), (-keluar['jumlah']).tolist(),
+                          keluar['stok_sebelum'].tolist(), keluar['stok_sesudah'].tolist(),
+                          keluar['gudang'].tolist(), keluar['tanggal'].tolist()))
+    return len(events)
+
+def write_penggunaan(c, events):
+    # id peminjaman AUTOINCREMENT: baris hasil import ini = id > last_id
+    last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM peminjaman").fetchone()[0]
+    total = import_penggunaan(c, events)
+    db.apply_usage_rollup(c, "id > ?", (last_id,))
+    return total
+
+# ================= HPP =================
+
+# dipakai juga input manual (app._insert_hpp); tanggal dinormalkan db.to_iso_date
+HPP_INSERT_SQL = """INSERT INTO hpp (unit, tanggal, material, harga, keterangan, import_hash, import_urutan)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+def hpp_import_rows(df, unit, sheet):
+    # hasil parse_pengeluaran_material -> baris import (kolom ledger + sheet)
+    df = df[df['Tanggal'].notna() & df['Harga'].notna()]
+    return pd.DataFrame({
+        'unit': unit,
+        'tanggal': pd.to_datetime(df['Tanggal']).dt.strftime('%Y-%m-%d'),
+        'material': df['Material'],
+        'harga': df['Harga'],
+        'sheet': sheet,
+    })
+
+def write_hpp_rows(c, rows, keterangan=""):
+    last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM hpp").fetchone()[0]
+    c.executemany(HPP_INSERT_SQL, zip(rows['unit'].tolist(), map(db.to_iso_date, rows['tanggal'].tolist()),
+                                      rows['material'].tolist(), rows['harga'].tolist(), [keterangan] * len(rows),
+                                      *_import_keys(rows)))
+    db.apply_hpp_rollup(c, "id > ?", (last_id,))
+    return len(rows)
+
+# ================= LEDGER & BATCH =================
+
+# kolom yang menentukan identitas baris import di import_ledger (satuan dan
+# keterangan tidak ikut, supaya koreksi teks tidak mengimpor ulang jumlahnya).
+# Nama sheet ikut, jadi baris identik di sheet/workbook lain tetap diimpor;
+# yang dilewati hanya upload ulang sheet yang sama.
+LEDGER_KEYS = {
+    'barang_masuk': ['sheet', 'nama_barang', 'jumlah', 'tanggal', 'gudang'],
+    'penggunaan': ['sheet', 'nama_barang', 'jumlah', 'tanggal', 'unit'],
+    'hpp': ['sheet', 'unit', 'tanggal', 'material', 'harga'],
+}
+
+def new_import_rows(c, jenis, events):
+    # events: baris ternormalisasi dengan kolom 'sheet'. Sheet yang isinya sudah
+    # pernah diimpor dilewati utuh; dari sisanya hanya baris yang belum tercatat
+    # yang dikembalikan. Semua hash dicatat di transaksi pemanggil.
+    # Mengembalikan (events baru, daftar sheet yang dilewati, jumlah baris dilewati).
+    hashes = excel_import.row_hashes(events, LEDGER_KEYS[jenis])
+    urutan = hashes.groupby(hashes, sort=False).cumcount()
+    baru = pd.Series(True, index=events.index)
+    skipped_sheets = []
+    for sheet, idx in events.groupby('sheet', sort=False).groups.items():
+        sheet_hash = excel_import.sheet_hash(hashes[idx])
+        if db.ledger_has_sheet(c, jenis, sheet_hash):
+            skipped_sheets.append(sheet)
+            baru[idx] = False
+        else:
+            db.ledger_record(c, jenis, 'sheet', [(sheet_hash, 0)], sheet)
+
+    sisa = baru.copy()
+    baru[sisa] = _record_new_rows(c, jenis, hashes[sisa], urutan[sisa])
+    rows = events[baru].assign(import_hash=hashes[baru], import_urutan=urutan[baru])
+    return rows, skipped_sheets, int((~baru).sum())
+
+def _record_new_rows(c, jenis, hashes, urutan):
+    # mask baris yang (hash, urutan)-nya belum tercatat; baris itu langsung dicatat
+    known = db.ledger_known_rows(c, jenis, hashes)
+    baru = np.array([key not in known for key in zip(hashes, urutan)], dtype=bool)
+    db.ledger_record(c, jenis, 'baris', zip(hashes[baru], urutan[baru].tolist()))
+    return baru
+
+def stream_import_sheet(jenis, sheet, chunks, write_chunk, seen, total, progress=None):
+    # Mode streaming: setiap chunk baris ternormalisasi disaring ledger lalu
+    # ditulis write_chunk(c, rows) dan di-commit sendiri bersama catatan
+    # ledger dan ringkasannya. Memori sebatas satu chunk, dan import yang
+    # terputus cukup diulang (baris yang sudah masuk dilewati). `seen`
+    # (hash -> jumlah kemunculan) dibawa lintas chunk dan sheet supaya urutan
+    # baris identik sama dengan mode biasa. write_chunk mengembalikan tuple
+    # hitungan yang dijumlahkan ke `total`; progress(baris) dipanggil setelah
+    # setiap chunk ter-commit.
+    # Mengembalikan (total, True bila semua baris sheet sudah pernah diimpor,
+    # jumlah baris yang dilewati).
+    hasher = hashlib.sha256()
+    jumlah_baris, jumlah_baru = 0, 0
+    for rows in chunks:
+        if rows.empty:
+            continue
+        hashes = excel_import.row_hashes(rows, LEDGER_KEYS[jenis])
+        urutan = hashes.groupby(hashes, sort=False).cumcount() + hashes.map(seen).fillna(0).astype('int64')
+        for h, n in hashes.value_counts(sort=False).items():
+            seen[h] = seen.get(h, 0) + n
+        excel_import.sheet_hash_update(hasher, hashes, lanjutan=jumlah_baris > 0)
+        with db.transaction() as c:
+            baru = _record_new_rows(c, jenis, hashes, urutan)
+            hasil = write_chunk(c, rows[baru].assign(import_hash=hashes[baru], import_urutan=urutan[baru]))
+        total = tuple(a + b for a, b in zip(total, hasil))
+        jumlah_baris += len(rows)
+        jumlah_baru += int(baru.sum())
+        if progress:
+            progress(len(rows))
+    if jumlah_baris:
+        with db.transaction() as c:
+            db.ledger_record(c, jenis, 'sheet', [(hasher.hexdigest(), 0)], sheet)
+    return total, jumlah_baris > 0 and jumlah_baru == 0, jumlah_baris - jumlah_baru
+
+IMPORT_BATCH_ROWS = excel_import.STREAM_CHUNK_ROWS
+
+def write_import_sheets(jenis, sheet_events, write_chunk, total, progress):
+    # Mode biasa: semua sheet ditulis dalam satu transaksi, tapi ledger
+    # disaring per sheet dan baris baru ditulis per IMPORT_BATCH_ROWS supaya
+    # progress job bergerak. Setiap batch membaca stok hasil batch
+    # sebelumnya, jadi hasilnya sama dengan menulis sekaligus. write_chunk
+    # dan `total` sama seperti di stream_import_sheet.
+    # Mengembalikan (total, daftar sheet yang dilewati, jumlah baris dilewati).
+    progress(0, sum(len(events) for events in sheet_events))
+    skipped_sheets, skipped_rows = [], 0
+    with db.transaction() as c:
+        for events in sheet_events:
+            baru, dilewati, dilewati_baris = new_import_rows(c, jenis, events)
+            skipped_sheets += dilewati
+            skipped_rows += dilewati_baris
+            progress(dilewati_baris)
+            for start in range(0, len(baru), IMPORT_BATCH_ROWS):
+                batch = baru.iloc[start:start + IMPORT_BATCH_ROWS]
+                total = tuple(a + b for a, b in zip(total, write_chunk(c, batch)))
+                progress(len(batch))
+    return total, skipped_sheets, skipped_rows
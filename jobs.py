@@ -0,0 +1,81 @@
+# ================= IMPORT EXCEL DI BACKGROUND =================
+# Import dijalankan berurutan oleh satu thread worker per proses server.
+# Status, jumlah baris yang sudah diproses, hasil dan error disimpan di
+# memori proses (bukan di database), jadi progress bisa dipantau dari
+# halaman/sesi mana pun dan tidak hilang saat browser di-refresh, tanpa
+# membuat database terlihat berubah oleh watcher sync Drive dan tanpa ikut
+# snapshot. Job hilang bersama antriannya saat server dimulai ulang; baris
+# yang sudah masuk dilewati ledger saat file diupload ulang.
+
+import queue
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+STATUS_AKTIF = ('antri', 'jalan')
+KOLOM = ['id', 'jenis', 'nama_file', 'status', 'baris_diproses', 'baris_total', 'hasil', 'error']
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_jobs = {}
+_worker = {"thread": None, "next_id": 1}
+# job selesai yang lebih lama dari ini dibuang saat submit berikutnya
+SIMPAN_MENIT = 60
+
+def submit(jenis, nama_file, fn):
+    # fn(progress) dijalankan di thread worker dan mengembalikan dict pesan
+    # (success/info/warning/errors) untuk ditampilkan. progress(baris,
+    # total=None) menambah baris_diproses.
+    batas = datetime.now() - timedelta(minutes=SIMPAN_MENIT)
+    with _lock:
+        for lama in [i for i, job in _jobs.items() if job['finished_at'] and job['finished_at'] < batas]:
+            del _jobs[lama]
+        job_id = _worker["next_id"]
+        _worker["next_id"] += 1
+        _jobs[job_id] = {'id': job_id, 'jenis': jenis, 'nama_file': nama_file, 'status': 'antri',
+                         'baris_diproses': 0, 'baris_total': None, 'hasil': {}, 'error': None,
+                         'finished_at': None}
+        thread = _worker["thread"]
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_worker_loop, name="import-jobs", daemon=True)
+            _worker["thread"] = thread
+            thread.start()
+    _queue.put((job_id, fn))
+    return job_id
+
+def _update(job_id, **kolom):
+    with _lock:
+        _jobs[job_id].update(kolom)
+
+def _progress(job_id, baris, total=None):
+    with _lock:
+        job = _jobs[job_id]
+        job['baris_diproses'] += baris
+        if total is not None:
+            job['baris_total'] = total
+
+def _worker_loop():
+    while True:
+        job_id, fn = _queue.get()
+        _update(job_id, status='jalan')
+        try:
+            hasil = fn(lambda baris, total=None: _progress(job_id, baris, total))
+        except Exception as e:
+            _update(job_id, status='gagal', error=str(e), finished_at=datetime.now())
+        else:
+            _update(job_id, status='selesai', hasil=hasil, finished_at=datetime.now())
+
+def has_active():
+    with _lock:
+        return any(job['status'] in STATUS_AKTIF for job in _jobs.values())
+
+def recent(minutes=60, limit=5):
+    # job aktif dan yang selesai dalam `minutes` menit terakhir, terbaru dulu
+    batas = datetime.now() - timedelta(minutes=minutes)
+    with _lock:
+        rows = [dict(job) for job in _jobs.values()
+                if job['status'] in STATUS_AKTIF
+                or (job['finished_at'] is not None and job['finished_at'] >= batas)]
+    rows = sorted(rows, key=lambda job: job['id'], reverse=True)[:limit]
+    return pd.DataFrame(rows, columns=KOLOM)
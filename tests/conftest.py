@@ -0,0 +1,51 @@
+# Fixture bersama: setiap test memakai database SQLite baru di tmp_path yang
+# sudah dimigrasi, tidak pernah inventory_rumah.db milik aplikasi.
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import pytest
+from streamlit import config
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# db.py membaca st.secrets["DB_PATH"] saat di-import
+_secrets_dir = tempfile.mkdtemp(prefix="inventory-test-")
+_secrets_file = os.path.join(_secrets_dir, "secrets.toml")
+with open(_secrets_file, "w") as f:
+    f.write(f'DB_PATH = "{os.path.join(_secrets_dir, "inventory_test.db")}"\n')
+config.set_option("secrets.files", [_secrets_file])
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def new_db():
+    # cursor database in-memory dengan skema terbaru, untuk fungsi tulis yang
+    # menerima cursor; bisa dipanggil berkali-kali untuk membandingkan hasil
+    conns = []
+
+    def make():
+        conn = sqlite3.connect(":memory:")
+        conns.append(conn)
+        c = conn.cursor()
+        for step in db.MIGRATIONS:
+            step(c)
+        return c
+
+    yield make
+    for conn in conns:
+        conn.close()
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "inventory_test.db"))
+    monkeypatch.setattr(db, "_local", threading.local())
+    monkeypatch.setitem(db._migrated, "done", False)
+    db.migrate()
+    yield db.get_conn()
+    db.get_conn().close()
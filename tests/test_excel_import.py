@@ -0,0 +1,69 @@
+# Mode streaming (chunk baris openpyxl read-only) harus memberi sel yang
+# sama dengan parsing satu sheet penuh lewat pd.read_excel.
+
+import pandas as pd
+import pandas.testing as tm
+import pytest
+from openpyxl import Workbook
+
+import excel_import
+
+DAY_ROW = 2
+HEADER = ["NO", "NAMA BARANG", "JUMLAH", "SATUAN", "SEN", "SEL", "RAB", "KAM", "JUM", "SAB", "MIN", "KET"]
+
+SHEETS = {
+    "Minggu 1": [
+        [1, "Semen", None, "sak", 2, None, 3, None, None, 1, None, None],
+        [2, "Pasir", None, None, None, "4", None, 2.0, None, None, 1, "teks"],
+        [3, None, None, "pcs", 5, 5, None, None, None, None, None, None],     # tanpa nama: dilewati
+        [4, "Cat", None, "kaleng", 0, -1, 2.7, None, "x", None, 3, None],
+        [None, None, None, None, None, None, None, None, None, None, None, None],
+        [5, "Kuas", None, "pcs", None, None, None, None, 6, None, None, None],
+        [6, "Paku", None, "kg", 1, 1, 1, 1, 1, 1, 1, None],
+        [7, "Semen", None, "sak", None, None, None, None, None, None, 2, None],
+    ],
+    # kolom SEN kedua (pandas: 'SEN.1') tidak dibaca, seperti import lama
+    "Minggu 2": [
+        [1, "Batu", None, "m3", 1, 2, 3, None, None, None, None, 4],
+        [2, "Semen", None, None, 5, None, None, None, 1, None, None, None],
+    ],
+    "Kosong": [],
+}
+
+@pytest.fixture(scope="module")
+def workbook(tmp_path_factory):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in SHEETS.items():
+        ws = wb.create_sheet(name)
+        ws.append(["LAPORAN MINGGUAN"])
+        ws.append([None, "Periode", None, "Februari"])
+        header = HEADER if name != "Minggu 2" else HEADER[:-1] + ["SEN"]
+        ws.append(header)
+        for row in rows:
+            ws.append(row)
+    path = tmp_path_factory.mktemp("excel") / "mingguan.xlsx"
+    wb.save(path)
+    return path
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, DAY_ROW + 1, 4, excel_import.STREAM_CHUNK_ROWS])
+def test_stream_weekly_cells_sama_dengan_weekly_cells(workbook, chunk_rows):
+    _, cells = excel_import.parse_weekly_workbook(workbook.read_bytes(), DAY_ROW)
+    assert excel_import.stream_sheet_names(workbook) == list(cells)
+    for sheet, expected in cells.items():
+        chunks = list(excel_import.stream_weekly_cells(workbook, sheet, DAY_ROW, chunk_rows))
+        if not chunks:
+            assert expected.empty, sheet
+            continue
+        streamed = pd.concat(chunks, ignore_index=True)
+        tm.assert_frame_equal(streamed, expected.reset_index(drop=True), check_dtype=False, obj=sheet)
+
+def test_weekly_cells_urutan_dan_jumlah(workbook):
+    _, cells = excel_import.parse_weekly_workbook(workbook.read_bytes(), DAY_ROW)
+    semen = cells["Minggu 1"].query("nama_barang == 'Semen'")
+    assert semen[['jumlah', 'hari']].values.tolist() == [[2, 0], [3, 2], [1, 5], [2, 6]]
+    # 2.7 -> 2, 0 / -1 / teks dilewati, satuan kosong -> pcs
+    assert cells["Minggu 1"].query("nama_barang == 'Cat'")['jumlah'].tolist() == [2, 3]
+    assert set(cells["Minggu 1"].query("nama_barang == 'Pasir'")['satuan']) == {'pcs'}
+    # SEN kedua di Minggu 2 (isi 4) tidak dibaca
+    assert cells["Minggu 2"][['jumlah', 'hari']].values.tolist() == [[1, 0], [2, 1], [3, 2], [5, 0], [1, 4]]
@@ -0,0 +1,253 @@
+# importer.py dibandingkan dengan import lama yang memproses sel satu per
+# satu (lookup, UPDATE dan INSERT per sel) pada database yang sama isinya.
+
+import pandas as pd
+import pandas.testing as tm
+
+import db
+import importer
+
+BARANG_AWAL = [
+    ("Semen", 10, "sak", "Gudang 1", "2024-01-01"),
+    ("Paku", 5, "kg", "Gudang 1", "2024-01-01"),
+    ("paku", 7, "kg", "Gudang 1", "2024-01-02"),
+    ("Cat", 3, "kaleng", "Gudang 2", "2024-01-01"),
+    ("Kuas", 4, "pcs", "Gudang 2", "2024-01-01"),
+    ("Kuas", 9, "pcs", "Gudang 1", "2024-01-01"),
+]
+
+def _isi_barang(c, rows=BARANG_AWAL):
+    c.executemany("INSERT INTO barang (nama_barang, stok, besaran_stok, gudang, created_at) VALUES (?, ?, ?, ?, ?)",
+                  rows)
+
+def _tabel(c, table):
+    c.execute(f"SELECT * FROM {table} ORDER BY id")
+    columns = [d[0] for d in c.description]
+    return pd.DataFrame(c.fetchall(), columns=columns)
+
+# ================= BARANG MASUK =================
+
+def _barang_masuk_per_sel(c, events):
+    # import barang masuk lama (app.py sebelum bulk import), satu sel per iterasi
+    for e in events.itertuples(index=False):
+        c.execute("""SELECT id, stok FROM barang WHERE LOWER(nama_barang) = LOWER(?) AND LOWER(gudang) = LOWER(?)
+                     ORDER BY id""", (e.nama_barang, e.gudang))
+        existing = c.fetchone()
+        if existing:
+            barang_id, stok_lama = existing
+            stok_baru = stok_lama + e.jumlah
+            c.execute("UPDATE barang SET stok = ?, besaran_stok = ? WHERE id = ?", (stok_baru, e.satuan, barang_id))
+            c.execute("""INSERT INTO riwayat_stok
+                        (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                      (barang_id, e.nama_barang, e.jumlah, stok_lama, stok_baru, e.gudang, e.tanggal))
+        else:
+            c.execute("INSERT INTO barang (nama_barang, stok, besaran_stok, gudang, created_at) VALUES (?, ?, ?, ?, ?)",
+                      (e.nama_barang, e.jumlah, e.satuan, e.gudang, e.tanggal))
+            c.execute("""INSERT INTO riwayat_stok
+                        (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                      (c.lastrowid, e.nama_barang, e.jumlah, 0, e.jumlah, e.gudang, e.tanggal))
+
+def _barang_masuk_events(rows):
+    return pd.DataFrame(rows, columns=['nama_barang', 'satuan', 'jumlah', 'tanggal', 'gudang'])
+
+def _assert_barang_masuk_sama(new_db, events, awal=BARANG_AWAL):
+    lama, baru = new_db(), new_db()
+    _isi_barang(lama, awal)
+    _isi_barang(baru, awal)
+    _barang_masuk_per_sel(lama, events)
+    importer.import_barang_masuk(baru, events)
+    for table in ('barang', 'riwayat_stok'):
+        tm.assert_frame_equal(_tabel(baru, table), _tabel(lama, table))
+
+def test_import_barang_masuk_sama_dengan_per_sel(new_db):
+    events = _barang_masuk_events([
+        ("SEMEN", "sak", 5, "2024-02-05", "gudang 1"),       # barang lama, beda huruf besar
+        ("Pasir", "m3", 2, "2024-02-05", "Gudang 1"),        # barang baru
+        ("Paku", "kg", 1, "2024-02-05", "Gudang 1"),         # nama ganda -> id terkecil
+        ("pasir", "karung", 3, "2024-02-06", "Gudang 1"),    # barang baru muncul lagi, satuan berubah
+        ("Cat", "kaleng", 4, "2024-02-06", "Gudang 1"),      # ada di Gudang 2 saja -> baru di Gudang 1
+        ("Kuas", "pcs", 6, "2024-02-06", "Gudang 2"),        # nama sama di dua gudang
+        ("Semen", "zak", 1, "2024-02-07", "Gudang 1"),
+        ("Pasir", "m3", 1, "2024-02-07", "Gudang 2"),
+    ])
+    _assert_barang_masuk_sama(new_db, events)
+
+def test_import_barang_masuk_hitungan(new_db):
+    c = new_db()
+    _isi_barang(c)
+    events = _barang_masuk_events([
+        ("Semen", "sak", 5, "2024-02-05", "Gudang 1"),
+        ("Pasir", "m3", 2, "2024-02-05", "Gudang 1"),
+        ("Pasir", "m3", 3, "2024-02-06", "Gudang 1"),
+    ])
+    # (barang baru, penambahan stok)
+    assert importer.import_barang_masuk(c, events) == (1, 2)
+    assert importer.import_barang_masuk(c, events.iloc[:0]) == (0, 0)
+
+def test_import_barang_masuk_database_kosong(new_db):
+    events = _barang_masuk_events([
+        ("Pasir", "m3", 2, "2024-02-05", "Gudang 1"),
+        ("Batu", "m3", 1, "2024-02-05", "Gudang 2"),
+        ("PASIR", "m3", 4, "2024-02-06", "Gudang 1"),
+    ])
+    _assert_barang_masuk_sama(new_db, events, awal=[])
+
+# ================= PENGGUNAAN =================
+
+def _penggunaan_per_sel(c, events):
+    # import penggunaan lama: satu baris peminjaman per sel, stok barang
+    # pertama yang namanya cocok (urutan index LOWER(nama), LOWER(gudang)) dikurangi
+    for e in events.itertuples(index=False):
+        c.execute("""INSERT INTO peminjaman
+                        (barang_id, nama_barang, jumlah_pinjam, tanggal_pinjam, unit, besaran_stok, gudang)
+                        VALUES (NULL, ?, ?, ?, ?, ?, 'Gudang 1')""",
+                  (e.nama_barang, e.jumlah, e.tanggal, e.unit, e.satuan))
+        c.execute("""SELECT id, stok, gudang FROM barang WHERE LOWER(nama_barang) = LOWER(?)
+                     ORDER BY LOWER(gudang), id""", (e.nama_barang,))
+        barang_data = c.fetchone()
+        if barang_data:
+            barang_id, stok_sekarang, gudang = barang_data
+            stok_baru = max(stok_sekarang - e.jumlah, 0)
+            c.execute("UPDATE barang SET stok = ? WHERE id = ?", (stok_baru, barang_id))
+            c.execute("""INSERT INTO riwayat_stok
+                        (barang_id, nama_barang, jumlah_tambah, stok_sebelum, stok_sesudah, gudang, tanggal_tambah)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                      (barang_id, e.nama_barang, -e.jumlah, stok_sekarang, stok_baru, gudang, e.tanggal))
+
+def _penggunaan_events(rows):
+    return pd.DataFrame(rows, columns=['nama_barang', 'satuan', 'jumlah', 'tanggal', 'unit'])
+
+def test_import_penggunaan_sama_dengan_per_sel(new_db):
+    events = _penggunaan_events([
+        ("semen", "sak", 4, "2024-02-05", "Unit A"),    # beda huruf besar
+        ("Cat", "kaleng", 2, "2024-02-05", "Unit A"),
+        ("Cat", "kaleng", 5, "2024-02-06", "Unit B"),   # stok habis -> clamp 0
+        ("CAT", "kaleng", 1, "2024-02-07", "Unit B"),   # tetap 0
+        ("Kuas", "pcs", 3, "2024-02-05", "Unit A"),     # dua gudang -> Gudang 1 (LOWER(gudang), id)
+        ("Paku", "kg", 2, "2024-02-05", "Unit A"),      # nama ganda satu gudang -> id terkecil
+        ("Pasir", "m3", 6, "2024-02-05", "Unit A"),     # tidak ada di barang: hanya peminjaman
+        ("Semen", "sak", 3, "2024-02-08", "Unit B"),
+    ])
+    lama, baru = new_db(), new_db()
+    _isi_barang(lama)
+    _isi_barang(baru)
+    _penggunaan_per_sel(lama, events)
+    assert importer.import_penggunaan(baru, events) == len(events)
+    for table in ('barang', 'riwayat_stok', 'peminjaman'):
+        tm.assert_frame_equal(_tabel(baru, table), _tabel(lama, table))
+
+def test_import_penggunaan_kosong(new_db):
+    c = new_db()
+    _isi_barang(c)
+    assert importer.import_penggunaan(c, _penggunaan_events([])) == 0
+    assert c.execute("SELECT COUNT(*) FROM peminjaman").fetchone()[0] == 0
+
+# ================= IMPORT LEDGER =================
+
+def _sheet(nama, rows):
+    return _penggunaan_events(rows).assign(sheet=nama)
+
+PAKAI_S1 = [
+    ("Semen", "sak", 4, "2024-02-05", "Unit A"),
+    ("Cat", "kaleng", 2, "2024-02-05", "Unit A"),
+    ("Semen", "sak", 4, "2024-02-05", "Unit A"),    # baris identik
+]
+
+def test_new_import_rows_lewati_sheet_utuh(new_db):
+    c = new_db()
+    events = _sheet("S1", PAKAI_S1)
+    rows, skipped_sheets, skipped = importer.new_import_rows(c, 'penggunaan', events)
+    assert len(rows) == 3 and skipped_sheets == [] and skipped == 0
+    # baris identik dibedakan urutan kemunculannya
+    assert rows['import_urutan'].tolist() == [0, 0, 1]
+    assert rows['import_hash'].iloc[0] == rows['import_hash'].iloc[2]
+
+    rows, skipped_sheets, skipped = importer.new_import_rows(c, 'penggunaan', events)
+    assert rows.empty and skipped_sheets == ["S1"] and skipped == 3
+
+def test_new_import_rows_lewati_baris_lama(new_db):
+    c = new_db()
+    importer.new_import_rows(c, 'penggunaan', _sheet("S1", PAKAI_S1))
+    ubah = _sheet("S1", PAKAI_S1 + [
+        ("Kuas", "pcs", 1, "2024-02-06", "Unit B"),
+        ("Semen", "sak", 4, "2024-02-05", "Unit A"),    # kemunculan ketiga
+    ])
+    rows, skipped_sheets, skipped = importer.new_import_rows(c, 'penggunaan', ubah)
+    assert skipped_sheets == [] and skipped == 3
+    assert rows['nama_barang'].tolist() == ["Kuas", "Semen"]
+    assert rows['import_urutan'].tolist() == [0, 2]
+
+def test_new_import_rows_sheet_lain_tetap_diimpor(new_db):
+    c = new_db()
+    importer.new_import_rows(c, 'penggunaan', _sheet("S1", PAKAI_S1))
+    events = pd.concat([_sheet("S1", PAKAI_S1), _sheet("S2", PAKAI_S1)], ignore_index=True)
+    rows, skipped_sheets, skipped = importer.new_import_rows(c, 'penggunaan', events)
+    assert skipped_sheets == ["S1"] and skipped == 3
+    assert rows['sheet'].tolist() == ["S2"] * 3
+
+def test_ledger_forget_baris_yang_dihapus(new_db):
+    c = new_db()
+    events = _sheet("S1", PAKAI_S1)
+    rows, _, _ = importer.new_import_rows(c, 'penggunaan', events)
+    importer.import_penggunaan(c, rows)
+
+    # hapus baris identik kedua seperti delete_penggunaan
+    hapus = c.execute("SELECT id FROM peminjaman WHERE import_urutan = 1").fetchone()[0]
+    assert db.ledger_forget(c, 'peminjaman', "id = ?", (hapus,)) == 1
+    c.execute("DELETE FROM peminjaman WHERE id = ?", (hapus,))
+
+    # upload ulang: sheet tidak lagi dilewati utuh, hanya baris yang dihapus yang masuk lagi
+    rows, skipped_sheets, skipped = importer.new_import_rows(c, 'penggunaan', events)
+    assert skipped_sheets == [] and skipped == 2
+    assert rows['import_urutan'].tolist() == [1]
+    # baris input manual (tanpa kunci ledger) tidak menyentuh ledger
+    c.execute("""INSERT INTO peminjaman (nama_barang, jumlah_pinjam, tanggal_pinjam, unit, besaran_stok, gudang)
+                 VALUES ('Semen', 1, '2024-02-05', 'Unit A', 'sak', 'Gudang 1')""")
+    assert db.ledger_forget(c, 'peminjaman', "id = ?", (c.lastrowid,)) == 0
+
+def test_stream_import_sheet_sama_dengan_mode_biasa(conn, new_db):
+    events = _sheet("S1", PAKAI_S1 * 3)
+
+    def write_chunk(c, rows):
+        return (importer.write_penggunaan(c, rows),)
+
+    total, dilewati, skipped = importer.stream_import_sheet(
+        'penggunaan', "S1", [events.iloc[i:i + 2] for i in range(0, len(events), 2)], write_chunk, {}, (0,))
+    assert total == (9,) and not dilewati and skipped == 0
+
+    biasa = new_db()
+    importer.new_import_rows(biasa, 'penggunaan', events)
+    ledger = "SELECT jenis, tingkat, hash, urutan, keterangan FROM import_ledger ORDER BY 1, 2, 3, 4"
+    assert conn.execute(ledger).fetchall() == biasa.execute(ledger).fetchall()
+
+    # upload ulang dalam mode streaming dilewati seluruhnya
+    total, dilewati, skipped = importer.stream_import_sheet(
+        'penggunaan', "S1", [events], write_chunk, {}, (0,))
+    assert total == (0,) and dilewati and skipped == 9
+
+# ================= PROGRESS MODE BIASA =================
+
+def test_write_import_sheets_progress_per_batch(conn, monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_BATCH_ROWS", 2)
+    sheets = [_sheet("S1", PAKAI_S1), _sheet("S2", PAKAI_S1[:2])]
+    calls = []
+
+    def progress(baris, total=None):
+        calls.append((baris, total))
+
+    def write_chunk(c, rows):
+        return (importer.write_penggunaan(c, rows),)
+
+    total, skipped_sheets, skipped = importer.write_import_sheets('penggunaan', sheets, write_chunk, (0,), progress)
+    assert total == (5,) and skipped_sheets == [] and skipped == 0
+    # total baris dulu, lalu per sheet: baris dilewati, kemudian setiap batch
+    assert calls == [(0, 5), (0, None), (2, None), (1, None), (0, None), (2, None)]
+
+    calls.clear()
+    sheets.append(_sheet("S3", [("Kuas", "pcs", 1, "2024-02-06", "Unit B")]))
+    total, skipped_sheets, skipped = importer.write_import_sheets('penggunaan', sheets, write_chunk, (0,), progress)
+    assert total == (1,) and skipped_sheets == ["S1", "S2"] and skipped == 5
+    assert calls == [(0, 6), (3, None), (2, None), (0, None), (1, None)]
+    assert sum(baris for baris, _ in calls) == 6
@@ -0,0 +1,62 @@
+# Runner job import di memori: status, progress dan hasil terbaca lewat
+# recent() / has_active() dari thread mana pun.
+
+import threading
+import time
+
+import pytest
+
+import jobs
+
+@pytest.fixture(autouse=True)
+def kosongkan_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, "_jobs", {})
+
+def _tunggu(job_id, timeout=10):
+    batas = time.monotonic() + timeout
+    while jobs.has_active():
+        assert time.monotonic() < batas, "job tidak selesai"
+        time.sleep(0.01)
+    return jobs.recent().set_index('id').loc[job_id]
+
+def test_submit_progress_dan_hasil():
+    lanjut = threading.Event()
+
+    def fn(progress):
+        progress(0, 10)
+        progress(4)
+        lanjut.wait(5)
+        progress(6)
+        return {'success': ["10 baris"]}
+
+    job_id = jobs.submit('penggunaan', 'pakai.xlsx', fn)
+    assert jobs.has_active()
+    for _ in range(500):
+        job = jobs.recent().set_index('id').loc[job_id]
+        if job['baris_diproses'] == 4:
+            break
+        time.sleep(0.01)
+    assert (job['status'], job['baris_diproses'], job['baris_total']) == ('jalan', 4, 10)
+
+    lanjut.set()
+    job = _tunggu(job_id)
+    assert (job['status'], job['baris_diproses'], job['hasil']) == ('selesai', 10, {'success': ["10 baris"]})
+
+def test_job_gagal_mencatat_error_dan_antrian_berlanjut():
+    def gagal(progress):
+        raise ValueError("sheet rusak")
+
+    gagal_id = jobs.submit('hpp', 'hpp.xlsx', gagal)
+    ok_id = jobs.submit('hpp', 'hpp.xlsx', lambda progress: {})
+    _tunggu(ok_id)
+    rows = jobs.recent().set_index('id')
+    assert (rows.loc[gagal_id, 'status'], rows.loc[gagal_id, 'error']) == ('gagal', "sheet rusak")
+    assert rows.loc[ok_id, 'status'] == 'selesai'
+    # terbaru dulu
+    assert rows.index.tolist()[:2] == [ok_id, gagal_id]
+
+def test_recent_membuang_job_lama():
+    job_id = jobs.submit('hpp', 'hpp.xlsx', lambda progress: {})
+    _tunggu(job_id)
+    assert job_id in jobs.recent()['id'].tolist()
+    assert job_id not in jobs.recent(minutes=-1)['id'].tolist()
@@ -0,0 +1,133 @@
+# Tabel ringkasan yang dirawat bertahap harus selalu sama dengan GROUP BY
+# ulang dari tabel dasarnya, setelah insert maupun delete.
+
+import pandas as pd
+
+import db
+import importer
+
+# ================= RINGKASAN PENGGUNAAN =================
+
+def _usage_dari_dasar(c, table):
+    period_col, period_expr = {t: (col, expr) for t, col, expr in db.USAGE_ROLLUPS}[table]
+    return c.execute(f"""SELECT {period_expr}, nama_barang, besaran_stok, unit, SUM(jumlah_pinjam), COUNT(*)
+                         FROM peminjaman GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4""").fetchall()
+
+def _assert_usage_rollup(c):
+    for table, period_col, _ in db.USAGE_ROLLUPS:
+        rollup = c.execute(f"""SELECT {period_col}, nama_barang, besaran_stok, unit, jumlah, transaksi
+                               FROM {table} ORDER BY 1, 2, 3, 4""").fetchall()
+        assert rollup == _usage_dari_dasar(c, table), table
+
+def _pakai(rows):
+    return pd.DataFrame(rows, columns=['nama_barang', 'satuan', 'jumlah', 'tanggal', 'unit'])
+
+def _hapus_penggunaan(c, where, params=()):
+    # seperti app.delete_penggunaan
+    db.apply_usage_rollup(c, where, params, sign=-1)
+    c.execute(f"DELETE FROM peminjaman WHERE {where}", params)
+
+def test_usage_rollup_insert_dan_hapus(new_db):
+    c = new_db()
+    importer.write_penggunaan(c, _pakai([
+        ("Semen", "sak", 4, "2024-02-05", "Unit A"),
+        ("Semen", "sak", 2, "2024-02-05", "Unit A"),
+        ("Semen", "sak", 1, "2024-02-06", "Unit A"),
+        ("Semen", "zak", 1, "2024-02-06", "Unit A"),
+        ("Cat", "kaleng", 3, "2024-03-01", "Unit B"),
+    ]))
+    _assert_usage_rollup(c)
+
+    # input manual dengan jam di tanggal_pinjam
+    c.execute("""INSERT INTO peminjaman (barang_id, nama_barang, jumlah_pinjam, tanggal_pinjam, unit, besaran_stok, gudang)
+                 VALUES (NULL, 'Cat', 5, '2024-03-01 14:30:00', 'Unit B', 'kaleng', 'Gudang 1')""")
+    db.apply_usage_rollup(c, "id = ?", (c.lastrowid,))
+    _assert_usage_rollup(c)
+
+    # sebagian kelompok dihapus: ringkasan dikurangi
+    _hapus_penggunaan(c, "id = ?", (2,))
+    _assert_usage_rollup(c)
+    # seluruh kelompok dihapus: baris ringkasannya ikut hilang
+    _hapus_penggunaan(c, "nama_barang = ?", ("Cat",))
+    _assert_usage_rollup(c)
+    assert c.execute("SELECT COUNT(*) FROM peminjaman_bulanan WHERE bulan = '2024-03'").fetchone()[0] == 0
+
+    importer.write_penggunaan(c, _pakai([("Semen", "sak", 7, "2024-02-05", "Unit A")]))
+    _assert_usage_rollup(c)
+
+def test_usage_rollup_migrasi_isi_dari_data_lama(new_db):
+    c = new_db()
+    importer.import_penggunaan(c, _pakai([
+        ("Semen", "sak", 4, "2024-02-05", "Unit A"),
+        ("Cat", "kaleng", 3, "2024-03-01", "Unit B"),
+    ]))
+    # tanpa apply_usage_rollup; migrasi membangun ulang dari peminjaman
+    db._migration_usage_rollups(c)
+    _assert_usage_rollup(c)
+
+# ================= RINGKASAN HPP =================
+
+def _assert_hpp_rollup(c):
+    for table, key_col, key_expr in db.HPP_ROLLUPS:
+        rollup = c.execute(f"""SELECT unit, {key_col}, total, jumlah, harga_min, harga_max
+                               FROM {table} ORDER BY 1, 2""").fetchall()
+        dasar = c.execute(f"""SELECT unit, {key_expr}, SUM(harga), COUNT(*), MIN(harga), MAX(harga)
+                              FROM hpp GROUP BY 1, 2 ORDER BY 1, 2""").fetchall()
+        assert rollup == dasar, table
+
+def _hpp(rows):
+    return pd.DataFrame(rows, columns=['unit', 'tanggal', 'material', 'harga'])
+
+HPP_AWAL = [
+    ("Unit A", "2024-01-05", "Semen", 1000.0),
+    ("Unit A", "2024-01-20", "Semen", 3000.0),
+    ("Unit A", "2024-01-21", "Semen", 2000.0),
+    ("Unit A", "2024-02-01", "Semen", 500.0),
+    ("Unit A", "2024-02-03", "Cat", 750.5),
+    ("Unit B", "2024-01-05", "Semen", 4000.0),
+    ("Unit B", "2024-01-31", "Pasir", 250.0),
+]
+
+def _hpp_id(c, tanggal, material, unit="Unit A"):
+    return c.execute("SELECT id FROM hpp WHERE unit = ? AND tanggal = ? AND material = ?",
+                     (unit, tanggal, material)).fetchone()[0]
+
+def test_hpp_rollup_insert(new_db):
+    c = new_db()
+    importer.write_hpp_rows(c, _hpp(HPP_AWAL))
+    _assert_hpp_rollup(c)
+    # batch kedua memperluas min/max kelompok yang sudah ada
+    importer.write_hpp_rows(c, _hpp([
+        ("Unit A", "2024-01-06", "Semen", 100.0),
+        ("Unit A", "2024-01-07", "Semen", 9000.0),
+        ("Unit C", "2024-04-01", "Batu", 10.0),
+    ]))
+    _assert_hpp_rollup(c)
+
+def test_delete_hpp_rows_hitung_ulang_min_max(new_db):
+    c = new_db()
+    importer.write_hpp_rows(c, _hpp(HPP_AWAL))
+
+    # bukan nilai ekstrem: hanya total/jumlah yang berubah
+    db.delete_hpp_rows(c, "id = ?", (_hpp_id(c, "2024-01-21", "Semen"),))
+    _assert_hpp_rollup(c)
+    # harga_min Unit A / 2024-01 dan Unit A / Semen ikut terhapus
+    db.delete_hpp_rows(c, "id = ?", (_hpp_id(c, "2024-01-05", "Semen"),))
+    _assert_hpp_rollup(c)
+    # harga_max Unit A / Semen terhapus, kelompok Unit A / 2024-01 habis
+    db.delete_hpp_rows(c, "id = ?", (_hpp_id(c, "2024-01-20", "Semen"),))
+    _assert_hpp_rollup(c)
+    assert c.execute("SELECT COUNT(*) FROM hpp_bulanan WHERE unit = 'Unit A' AND bulan = '2024-01'").fetchone()[0] == 0
+
+    # banyak kelompok sekaligus
+    db.delete_hpp_rows(c, "material = ?", ("Semen",))
+    _assert_hpp_rollup(c)
+    db.delete_hpp_rows(c, "1")
+    _assert_hpp_rollup(c)
+    assert c.execute("SELECT COUNT(*) FROM hpp_material").fetchone()[0] == 0
+
+def test_hpp_rollup_migrasi_isi_dari_data_lama(new_db):
+    c = new_db()
+    c.executemany("INSERT INTO hpp (unit, tanggal, material, harga) VALUES (?, ?, ?, ?)", HPP_AWAL)
+    db._migration_hpp_rollups(c)
+    _assert_hpp_rollup(c)